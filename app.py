@@ -1,10 +1,22 @@
+import os
+
 from dash import Dash, dcc, html
 import dash_cytoscape as cyto
 import dash_daq as daq
 
-from utils.graph_utilities import get_default_stylesheet
+from utils.cytoscape_style import get_default_stylesheet
 from utils.callbacks import register_callbacks
 
+# 設定 NETVIZ_BACKGROUND_CALLBACKS=1 時，分組計算改以 Dash 背景回調執行（本機 diskcache 管理器）
+background_manager = None
+if os.environ.get('NETVIZ_BACKGROUND_CALLBACKS') == '1':
+    import diskcache
+    from dash import DiskcacheManager
+    cache_dir = os.environ.get('NETVIZ_CACHE_DIR', './cache')
+    background_manager = DiskcacheManager(diskcache.Cache(cache_dir))
+    # 每個背景工作在新的行程中執行，分組結果快取需存到檔案才能跨工作重用（環境變數會傳給工作行程）
+    os.environ.setdefault('NETVIZ_PARTITION_CACHE_DIR', os.path.join(cache_dir, 'partitions'))
+
 # 初始化 Dash 應用
 app = Dash(
     __name__,
@@ -47,7 +59,19 @@ app.layout = html.Div([
                     ),
                     html.Div(id='hover-info', style={'margin-top': '20px', 'font-weight': 'bold'})
                 ]
-            )
+            ),
+            # 分組失敗（例如順位指向名單中不存在的座號）時的錯誤訊息
+            html.Div(id='partition-error', style={'color': 'red', 'font-size': '16px', 'margin-top': '5px'}),
+            # 背景分組計算的進度（僅在背景回調模式下顯示）
+            html.Div(id='solve-progress', style={'display': 'none'}),
+            # 上傳檔案在伺服器端工作階段快取中的 id，回調之間只傳遞這個 id
+            dcc.Store(id='upload-id'),
+            # 每次上傳/設定變更只驗證一次，結果供繪圖與訊息回調共用
+            dcc.Store(id='validation-store'),
+            # 目前 elements 對應的上傳檔案（雜湊值），用來判斷是否需要重新產生節點
+            dcc.Store(id='rendered-upload'),
+            # 每個節點目前的顏色 {node_id: color}，供分組結果顯示與 Patch 更新比對
+            dcc.Store(id='node-colors')
         ], style={'width': '100%', 'display': 'inline-block', 'vertical-align': 'top'}),
         
         # 分組結果顯示區域
@@ -71,10 +95,10 @@ app.layout = html.Div([
             dcc.Download(id="download-template"),
         ]),
 
-        html.Label("步驟二：上傳Excel", style={'font-weight': 'bold', 'font-size': '22px', 'margin-bottom': '5px', 'display': 'block'}),
+        html.Label("步驟二：上傳名單檔案", style={'font-weight': 'bold', 'font-size': '22px', 'margin-bottom': '5px', 'display': 'block'}),
         dcc.Upload(
             id='upload-data',
-            children=html.Div(html.A('選擇檔案(excel)')),
+            children=html.Div(html.A('選擇檔案(excel/csv/parquet)')),
             style={
                 'width': '100%',
                 'height': '60px',
@@ -88,6 +112,7 @@ app.layout = html.Div([
             multiple=False
         ),
         html.Div(id='file-name', style={'textAlign': 'center', 'margin-bottom': '10px'}),  # 顯示檔案名稱
+        html.Div(id='upload-report', style={'textAlign': 'center', 'color': 'red', 'margin-bottom': '10px'}),  # 顯示略過的問題列
 
         html.Div([
             html.Label("步驟三：男生/女生 相關設定", style={'font-weight': 'bold', 'font-size': '22px', 'margin-bottom': '5px', 'display': 'block'}),
@@ -189,6 +214,32 @@ app.layout = html.Div([
             })
         ]),
 
+        html.Div([
+            html.Label("權重掃描：比較不同加權倍數的分組", style={'font-weight': 'bold', 'font-size': '17px', 'margin-bottom': '5px', 'display': 'block'}),
+            dcc.RadioItems(
+                id='sweep-rule',
+                options=[
+                    {'label': '沒有被選擇的學生', 'value': 'isolated'},
+                    {'label': '被選擇次數最少的學生', 'value': 'min_in_degree'}
+                ],
+                value='isolated',
+                labelStyle={'display': 'inline-block', 'margin-right': '15px', 'font-size': '16px'}
+            ),
+            html.Button("開始掃描", id='sweep-button', n_clicks=0,
+                        style={'background-color': '#4CAF50', 'color': 'white',
+                            'border': 'none', 'padding': '10px 20px',
+                            'text-align': 'center', 'text-decoration': 'none',
+                            'display': 'inline-block', 'font-size': '16px',
+                            'border-radius': '5px', 'cursor': 'pointer', 'margin': '10px 0'}),
+            dcc.Loading(html.Div(id='sweep-results'), type="default")
+        ], style={
+            'background-color': '#f9f9f9',
+            'padding': '15px',
+            'border-radius': '10px',
+            'box-shadow': '0 1px 3px rgba(0, 0, 0, 0.1)',
+            'margin-bottom': '20px'
+        }),
+
         html.Div([
             html.Button(
                 '網絡圖進階設定', 
@@ -278,7 +329,7 @@ app.layout = html.Div([
 ], style={'display': 'flex', 'padding-left': '40px', 'padding-right': '40px'})
 
 # 註冊回調
-register_callbacks(app)
+register_callbacks(app, background_manager)
 
 if __name__ == '__main__':
     app.run_server(debug=True, host="0.0.0.0", port=8050)
@@ -0,0 +1,84 @@
+# measure_startup.py
+# 量測啟動時的匯入時間，避免重新引入啟動時載入的重量級套件。
+#
+# 用法：
+#     python measure_startup.py                      # 量測 app 與 netviz
+#     python measure_startup.py --max-seconds 1.5    # 超過時間上限時以非 0 結束
+#
+# 每次量測都在新的 Python 行程中匯入模組；下列 DEFERRED_MODULES 在啟動時被載入也視為退步。
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+
+# 啟動時不應載入的套件（在第一次分組、驗證或下載範本時才匯入；matplotlib 完全不使用）
+DEFERRED_MODULES = ('matplotlib', 'pandas', 'numpy', 'networkx', 'utils.graph_utilities', 'utils.file_processing')
+
+PROBE = '''
+import sys, time
+start = time.perf_counter()
+import {module}
+print(time.perf_counter() - start)
+print(','.join(sorted(sys.modules)))
+'''
+
+
+def measure_import(module, repeat=5):
+    """
+    在新的行程中匯入 module repeat 次
+
+    返回:
+    - seconds: 每次匯入的時間（秒）列表
+    - loaded: 匯入後已載入的模組名稱集合
+    """
+    seconds, loaded = [], set()
+    for _ in range(repeat):
+        output = subprocess.run([sys.executable, '-c', PROBE.format(module=module)], capture_output=True, text=True,
+                                check=True, cwd=os.path.dirname(os.path.abspath(__file__))).stdout.splitlines()
+        seconds.append(float(output[0]))
+        loaded = set(output[1].split(','))
+    return seconds, loaded
+
+
+def slowest_imports(module, top=10):
+    """以 python -X importtime 列出匯入 module 時累計時間最長的模組 [(模組, 秒)]"""
+    stderr = subprocess.run([sys.executable, '-X', 'importtime', '-c', f'import {module}'], capture_output=True, text=True,
+                            check=True, cwd=os.path.dirname(os.path.abspath(__file__))).stderr
+    timings = []
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        timings.append((name.strip(), int(cumulative) / 1e6))
+    return sorted(timings, key=lambda timing: -timing[1])[:top]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Measure import time of the app and fail on startup regressions.')
+    parser.add_argument('--module', action='append', help='module to import (default: app and netviz)')
+    parser.add_argument('--repeat', type=int, default=5, help='fresh interpreters per module')
+    parser.add_argument('--max-seconds', type=float, help='fail when the median import time exceeds this')
+    parser.add_argument('--top', type=int, default=10, help='number of slowest imports to list')
+    args = parser.parse_args(argv)
+
+    failed = False
+    for module in args.module or ['app', 'netviz']:
+        seconds, loaded = measure_import(module, args.repeat)
+        median = statistics.median(seconds)
+        print(f"import {module}: median {median:.3f}s (min {min(seconds):.3f}s, max {max(seconds):.3f}s, {args.repeat} runs)")
+        for name, cumulative in slowest_imports(module, args.top):
+            print(f"    {cumulative:7.3f}s  {name}")
+
+        eager = [name for name in DEFERRED_MODULES if name in loaded]
+        if eager:
+            print(f"  FAIL: loaded at startup: {', '.join(eager)}")
+            failed = True
+        if args.max_seconds is not None and median > args.max_seconds:
+            print(f"  FAIL: median {median:.3f}s exceeds {args.max_seconds:.3f}s")
+            failed = True
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,173 @@
+# netviz.py
+# 不需啟動 Dash 伺服器的命令列與 Python 介面：讀取名單、執行與網頁相同的驗證與分組，輸出 JSON 或 Excel。
+#
+# 命令列用法：
+#     python netviz.py roster.xlsx --male-range 1 20 --female-range 21 40 \
+#         --male-groups 4,4,4,4,4 --female-groups 4,4,4,4,4 [-o groups.json | -o groups.xlsx]
+#
+# Python 用法：
+#     import netviz
+#     result = netviz.partition('roster.xlsx', (1, 20), (21, 40), '4,4,4,4,4', '4,4,4,4,4')
+#
+# pandas、networkx 等套件在第一次分組時才載入，Dash 與 matplotlib 完全不會載入，匯入本模組幾乎沒有成本。
+import argparse
+import json
+import os
+import sys
+import time
+
+GENDERS = ('male', 'female')
+
+
+def load_roster(path):
+    """
+    讀取名單檔案（Excel、CSV 或 Parquet），返回 (DataFrame, 錯誤報告)，格式同 read_roster_streaming；
+    無法讀取時拋出 ValueError
+    """
+    from utils.file_processing import read_roster_streaming
+
+    with open(path, 'rb') as f:
+        df, report = read_roster_streaming(f.read())
+    if df is None:
+        raise ValueError(f"Could not read {path}: {report['error']}")
+    return df, report
+
+
+def _group_sizes_text(group_sizes):
+    """組別大小可為列表或 "4, 4, 4" 字串，統一轉為網頁使用的字串格式"""
+    if isinstance(group_sizes, str):
+        return group_sizes
+    return ", ".join(str(size) for size in group_sizes)
+
+
+def partition(roster, male_range, female_range, male_group_sizes, female_group_sizes, preference_option='option1',
+              executor=None, name=None):
+    """
+    驗證名單並求出男生、女生的分組，與網頁的 validate_and_process_data 及 apply_partition_and_color 相同。
+
+    參數:
+    - roster: 名單檔案路徑，或包含 'st_id', 'order1', 'order2', 'order3' 的 DataFrame
+    - male_range / female_range: 男生、女生的座號範圍 (start, end)
+    - male_group_sizes / female_group_sizes: 組別大小列表，或 "4, 4, 4, 2" 形式的字串
+    - preference_option: 'option1', 'option2' 或 'option3'
+    - executor: 可選的 Executor，同時計算男女分組
+    - name: 結果的名稱（寫入 Excel 的 class 欄），None 表示使用檔名
+
+    返回:
+    - {'class', 'valid', 'warning', 'validation', 'male_group_check', 'female_group_check', 'upload_report',
+       'groups': {性別: {group_id: [st_id, ...]}}, 'summary': [每個性別的統計], 'seconds', 'error'}；
+      驗證失敗時 valid 為 False、groups 為空，error 為警告或驗證訊息
+    """
+    from utils.graph_utilities import calculate_group_weights, create_separate_directed_graphs, partition_student_groups
+    from utils.validation import is_valid, validate_roster
+
+    start = time.perf_counter()
+    upload_report = None
+    if isinstance(roster, (str, os.PathLike)):
+        name = name or os.path.splitext(os.path.basename(roster))[0]
+        roster, upload_report = load_roster(roster)
+
+    male_group_sizes = _group_sizes_text(male_group_sizes)
+    female_group_sizes = _group_sizes_text(female_group_sizes)
+    (male_start, male_end), (female_start, female_end) = male_range, female_range
+    warning_message, validation_message, male_group_check, female_group_check = validate_roster(
+        roster, male_start, male_end, female_start, female_end, male_group_sizes, female_group_sizes
+    )
+    result = {
+        'class': name,
+        'valid': is_valid(warning_message, validation_message),
+        'warning': warning_message,
+        'validation': validation_message,
+        'male_group_check': male_group_check,
+        'female_group_check': female_group_check,
+        'upload_report': upload_report,
+        'groups': {},
+        'summary': [],
+        'seconds': 0.0,
+        'error': None,
+    }
+    if not result['valid']:
+        result['error'] = warning_message or validation_message
+        result['seconds'] = time.perf_counter() - start
+        return result
+
+    target_sizes = {
+        'male': [int(x.strip()) for x in male_group_sizes.split(',')],
+        'female': [int(x.strip()) for x in female_group_sizes.split(',')],
+    }
+    result['groups'] = partition_student_groups(roster, male_range, female_range, target_sizes['male'], target_sizes['female'],
+                                                preference_option, executor=executor)
+    graphs = dict(zip(GENDERS, create_separate_directed_graphs(roster, male_range, female_range)))
+    for gender in GENDERS:
+        intra_weight, inter_weight = calculate_group_weights(result['groups'][gender], graphs[gender])
+        result['summary'].append({
+            'gender': gender,
+            'students': sum(target_sizes[gender]),
+            'groups': len(target_sizes[gender]),
+            'intra_weight': intra_weight,
+            'inter_weight': inter_weight,
+        })
+    result['seconds'] = time.perf_counter() - start
+    return result
+
+
+def to_json(result):
+    """將 partition 的結果轉為 JSON 字串；各性別的分組依 group_id 排成列表"""
+    def plain(value):
+        # NumPy 整數等型態轉為 Python 內建型態
+        return value.item() if hasattr(value, 'item') else value
+
+    output = dict(result)
+    output['groups'] = {
+        gender: [sorted(plain(st_id) for st_id in groups[group_id]) for group_id in sorted(groups)]
+        for gender, groups in result['groups'].items()
+    }
+    return json.dumps(output, ensure_ascii=False, indent=2, default=plain)
+
+
+def write_excel(result, output_path):
+    """將 partition 的結果寫入活頁簿，格式與 utils.batch 的輸出相同（groups 與 summary 工作表）"""
+    from utils.batch import write_results
+
+    write_results([result], output_path)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='netviz', description='Validate a preference roster and partition it into groups without the web UI.')
+    parser.add_argument('roster', help='roster file (xlsx, xls, csv or parquet)')
+    parser.add_argument('--male-range', nargs=2, type=int, required=True, metavar=('START', 'END'))
+    parser.add_argument('--female-range', nargs=2, type=int, required=True, metavar=('START', 'END'))
+    parser.add_argument('--male-groups', required=True, help='male group sizes, e.g. 4,4,4,4')
+    parser.add_argument('--female-groups', required=True, help='female group sizes, e.g. 4,4,4,4')
+    parser.add_argument('--preference', default='option1', choices=['option1', 'option2', 'option3'])
+    parser.add_argument('-o', '--output', help='output file (.json or .xlsx); JSON is printed when omitted')
+    parser.add_argument('--format', choices=['json', 'excel'], help='output format (default: from the output file extension)')
+    args = parser.parse_args(argv)
+
+    output_format = args.format or ('excel' if args.output and args.output.lower().endswith(('.xlsx', '.xls')) else 'json')
+    if output_format == 'excel' and not args.output:
+        parser.error('--format excel requires --output')
+
+    try:
+        result = partition(args.roster, tuple(args.male_range), tuple(args.female_range),
+                           args.male_groups, args.female_groups, args.preference)
+    except (OSError, ValueError) as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 2
+
+    if output_format == 'excel':
+        write_excel(result, args.output)
+    elif args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(to_json(result))
+    else:
+        print(to_json(result))
+
+    if result['error'] is not None:
+        print(result['error'], file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,43 @@
+# tests/test_file_processing.py
+# 驗證上傳名單的逐列檢查：問題列被排除並以正確的原因回報，其餘列原樣保留。
+import pandas as pd
+import pytest
+
+from utils.file_processing import validate_roster_chunk, validate_roster_chunks
+
+VALID_ROW = [1, 2, 3, 4]
+
+
+@pytest.mark.parametrize("row, reason", [
+    (['abc', 2, 3, 4], 'non_integer'),
+    ([1, 2.5, 3, 4], 'non_integer'),
+    ([1, None, 3, 4], 'missing'),
+    ([2 ** 70, 2, 3, 4], 'out_of_range'),
+    ([1, 2, 3, -(2 ** 63)], 'out_of_range'),
+    ([1, 2, 1, 4], 'self_reference'),
+    ([1, 2, 3, 2], 'duplicate_choice'),
+    ([1, 2, 2, 4], 'duplicate_choice'),
+])
+def test_rejected_row_reason(row, reason):
+    chunk = pd.DataFrame([VALID_ROW, row], dtype=object)
+    values, rows, errors = validate_roster_chunk(chunk, first_row=2)
+    assert values.tolist() == [VALID_ROW]
+    assert rows.tolist() == [2]
+    assert errors == [(3, reason)]
+
+
+def test_blank_rows_are_skipped():
+    chunk = pd.DataFrame([VALID_ROW, [None] * 4], dtype=object)
+    values, _, errors = validate_roster_chunk(chunk, first_row=2)
+    assert values.tolist() == [VALID_ROW]
+    assert errors == []
+
+
+def test_report_counts_duplicate_ids_and_unknown_targets():
+    chunk = pd.DataFrame([[1, 2, 3, 4], [2, 1, 3, 4], [3, 1, 2, 4], [4, 1, 2, 3], [4, 1, 2, 3], [5, 1, 2, 9]])
+    df, report = validate_roster_chunks([chunk])
+    assert df['st_id'].tolist() == [1, 2, 3, 4, 5]
+    assert report['dropped'] == 1
+    assert report['counts']['duplicate_id'] == 1
+    assert report['unknown_targets'] == 1
+    assert report['target_errors'][0]['target'] == 9
@@ -0,0 +1,77 @@
+# tests/test_netviz.py
+# 命令列介面：參數解析、JSON 輸出，以及名單有問題時的結束代碼。
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+
+import netviz
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+ARGS = ['--male-range', '1', '8', '--female-range', '9', '16', '--male-groups', '4,4', '--female-groups', '4,4']
+
+
+def write_roster(path, extra_rows=()):
+    """男生 1-8、女生 9-16，每人選同性別的下三位同學"""
+    lines = ['座號,順位1,順位2,順位3']
+    for start in (1, 9):
+        for offset in range(8):
+            choices = [start + (offset + k) % 8 for k in (1, 2, 3)]
+            lines.append(",".join(str(value) for value in [start + offset, *choices]))
+    lines += [",".join(str(value) for value in row) for row in extra_rows]
+    path.write_text("\n".join(lines) + "\n", encoding='utf-8')
+    return str(path)
+
+
+def test_main_prints_json_groups(tmp_path, capsys):
+    roster = write_roster(tmp_path / 'roster.csv')
+    assert netviz.main([roster, *ARGS]) == 0
+    result = json.loads(capsys.readouterr().out)
+    assert result['valid'] and result['error'] is None
+    for gender, ids in (('male', range(1, 9)), ('female', range(9, 17))):
+        groups = result['groups'][gender]
+        assert sorted(len(group) for group in groups) == [4, 4]
+        assert sorted(st_id for group in groups for st_id in group) == list(ids)
+
+
+def test_main_writes_json_file(tmp_path, capsys):
+    roster = write_roster(tmp_path / 'roster.csv')
+    output = tmp_path / 'groups.json'
+    assert netviz.main([roster, *ARGS, '--preference', 'option2', '-o', str(output)]) == 0
+    assert capsys.readouterr().out == ''
+    assert json.loads(output.read_text(encoding='utf-8'))['class'] == 'roster'
+
+
+def test_main_invalid_roster_exits_with_1(tmp_path, capsys):
+    # 99 不在男生或女生的座號範圍內
+    roster = write_roster(tmp_path / 'roster.csv', extra_rows=[(99, 1, 2, 3)])
+    assert netviz.main([roster, *ARGS]) == 1
+    captured = capsys.readouterr()
+    assert json.loads(captured.out)['valid'] is False
+    assert '99' in captured.err
+
+
+def test_main_unreadable_roster_exits_with_2(tmp_path, capsys):
+    assert netviz.main([str(tmp_path / 'missing.csv'), *ARGS]) == 2
+    assert capsys.readouterr().err.startswith('Error:')
+
+
+@pytest.mark.parametrize("argv", [
+    ['roster.csv', '--male-range', '1', '8'],
+    ['roster.csv', *ARGS, '--format', 'excel'],
+    ['roster.csv', *ARGS, '--preference', 'option9'],
+])
+def test_main_rejects_bad_arguments(argv):
+    with pytest.raises(SystemExit) as excinfo:
+        netviz.main(argv)
+    assert excinfo.value.code == 2
+
+
+def test_command_line_exit_code(tmp_path):
+    roster = write_roster(tmp_path / 'roster.csv', extra_rows=[(99, 1, 2, 3)])
+    completed = subprocess.run([sys.executable, os.path.join(REPO_ROOT, 'netviz.py'), roster, *ARGS],
+                               capture_output=True, text=True, cwd=REPO_ROOT)
+    assert completed.returncode == 1
+    assert json.loads(completed.stdout)['valid'] is False
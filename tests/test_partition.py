@@ -0,0 +1,182 @@
+# tests/test_partition.py
+# 以暴力列舉驗證分支定界（以及啟發式初始解）與 CP-SAT 在小型圖上求得最優分組，
+# 並檢查模擬退火在任何停止時間、以及啟發式在大型名單上都返回合法的分組。
+import itertools
+import random
+import types
+
+import networkx as nx
+import pytest
+
+from utils.compact_graph import build_compact_graph
+from utils.graph_utilities import (
+    backtrack_optimize_groups, calculate_group_weights, convert_directed_to_undirected, optimize_graph_partition,
+    parallel_backtrack_optimize_groups,
+)
+from utils import graph_utilities, partition_heuristics
+from utils.partition_heuristics import anneal_optimize_groups, greedy_seed_groups, heuristic_optimize_groups
+from utils.session_store import SessionStore
+
+# (節點數, 組別大小, 亂數種子)；組別大小總和可大於節點數
+CASES = [
+    (6, [3, 3], 1),
+    (8, [4, 4], 2),
+    (8, [3, 3, 2], 3),
+    (9, [3, 3, 3], 4),
+    (9, [4, 3, 3], 5),
+    (10, [4, 3, 3], 6),
+    (9, [4, 4, 2], 8),
+    (5, [3, 3, 3], 9),
+    (8, [2, 2, 2, 2], 7),
+]
+
+# 啟發式的大型名單 (節點數, 組別大小, 亂數種子)：暴力列舉不可行，只檢查人數限制與不差於貪婪初始分組
+LARGE_CASES = [
+    (500, [5] * 100, 1),
+    (1000, [6] * 166 + [4], 2),
+    (1000, [7] * 145, 3),
+    (2000, [8] * 250, 4),
+]
+
+
+def random_preference_graph(num_nodes, seed):
+    """每個節點隨機選三個順位（權重 3, 2, 1）的有向圖，與上傳名單產生的圖相同"""
+    rng = random.Random(seed)
+    G = nx.DiGraph()
+    G.add_nodes_from(range(1, num_nodes + 1))
+    for node in G.nodes:
+        choices = rng.sample([other for other in G.nodes if other != node], 3)
+        for weight, target in zip([3, 2, 1], choices):
+            G.add_edge(node, target, weight=weight)
+    return G
+
+
+def brute_force_intra_weight(G, target_sizes):
+    """列舉每個節點的所有組別指派（不超過目標人數），返回最大的組內邊權重"""
+    index = {node: i for i, node in enumerate(G.nodes)}
+    edges = [(index[u], index[v], data['weight']) for u, v, data in G.edges(data=True)]
+    best = float('-inf')
+    for labels in itertools.product(range(len(target_sizes)), repeat=len(index)):
+        if any(labels.count(group_id) > size for group_id, size in enumerate(target_sizes)):
+            continue
+        best = max(best, sum(weight for u, v, weight in edges if labels[u] == labels[v]))
+    return best
+
+
+def check_groups(groups, G, target_sizes, intra_weight):
+    members = [node for group in groups.values() for node in group]
+    assert sorted(members) == sorted(G.nodes)
+    assert all(len(groups.get(group_id, [])) <= size for group_id, size in enumerate(target_sizes))
+    assert calculate_group_weights(groups, G)[0] == intra_weight
+
+
+@pytest.mark.parametrize("num_nodes, target_sizes, seed", CASES)
+def test_backtrack_matches_brute_force(num_nodes, target_sizes, seed):
+    undirected_G = convert_directed_to_undirected(random_preference_graph(num_nodes, seed))
+    groups, intra_weight, _ = backtrack_optimize_groups(build_compact_graph(undirected_G), target_sizes)
+    assert intra_weight == brute_force_intra_weight(undirected_G, target_sizes)
+    check_groups(groups, undirected_G, target_sizes, intra_weight)
+
+
+@pytest.mark.parametrize("num_nodes, target_sizes, seed", CASES)
+def test_exact_partition_matches_brute_force(num_nodes, target_sizes, seed):
+    directed_G = random_preference_graph(num_nodes, seed)
+    undirected_G = convert_directed_to_undirected(directed_G)
+    groups, intra_weight, _ = optimize_graph_partition(directed_G, target_sizes, time_limit=None)
+    assert intra_weight == brute_force_intra_weight(undirected_G, target_sizes)
+    check_groups(groups, undirected_G, target_sizes, intra_weight)
+
+
+def test_initial_groups_returned_when_optimal():
+    undirected_G = convert_directed_to_undirected(random_preference_graph(8, 2))
+    compact_G = build_compact_graph(undirected_G)
+    groups, intra_weight, _ = backtrack_optimize_groups(compact_G, [4, 4])
+    warm_groups, warm_intra_weight, _ = backtrack_optimize_groups(compact_G, [4, 4], initial_groups=groups)
+    assert warm_groups == groups and warm_intra_weight == intra_weight
+
+
+def test_parallel_matches_brute_force():
+    undirected_G = convert_directed_to_undirected(random_preference_graph(9, 4))
+    groups, intra_weight, _ = parallel_backtrack_optimize_groups(undirected_G, [3, 3, 3], max_workers=2)
+    assert intra_weight == brute_force_intra_weight(undirected_G, [3, 3, 3])
+    check_groups(groups, undirected_G, [3, 3, 3], intra_weight)
+
+
+@pytest.mark.parametrize("num_nodes, target_sizes, seed", CASES)
+def test_anneal_returns_valid_partition(num_nodes, target_sizes, seed):
+    undirected_G = convert_directed_to_undirected(random_preference_graph(num_nodes, seed))
+    compact_G = build_compact_graph(undirected_G)
+    groups, intra_weight, _ = anneal_optimize_groups(compact_G, target_sizes, time_limit=None, seed=seed)
+    check_groups(groups, undirected_G, target_sizes, intra_weight)
+    assert compact_G.group_weights(greedy_seed_groups(compact_G, target_sizes))[0] <= intra_weight
+    assert intra_weight <= brute_force_intra_weight(undirected_G, target_sizes)
+
+
+def test_anneal_same_seed_is_reproducible():
+    compact_G = build_compact_graph(convert_directed_to_undirected(random_preference_graph(30, 3)))
+    first = anneal_optimize_groups(compact_G, [5] * 6, time_limit=None, seed=1, cooling_rate=0.9)
+    second = anneal_optimize_groups(compact_G, [5] * 6, time_limit=None, seed=1, cooling_rate=0.9)
+    assert first == second
+
+
+def test_anneal_time_limit_stops_between_temperature_stages(monkeypatch):
+    # 以每次讀取前進 1 秒的假時鐘模擬時間用盡：時間上限 3 秒時在第 4 個溫度階段後停止。
+    # 結果取決於時間內完成幾個階段，因此真實時鐘下同一個 seed 的結果可能不同，但仍是合法分組。
+    undirected_G = convert_directed_to_undirected(random_preference_graph(30, 3))
+    compact_G = build_compact_graph(undirected_G)
+    full = anneal_optimize_groups(compact_G, [5] * 6, time_limit=None, seed=1, cooling_rate=0.9)
+    # 只執行 4 個階段：第 4 個階段後溫度低於 min_temperature
+    temperature = float(compact_G.weights.max())
+    four_stages = anneal_optimize_groups(compact_G, [5] * 6, time_limit=None, seed=1, cooling_rate=0.9,
+                                         min_temperature=temperature * 0.9 ** 4 * (1 + 1e-9))
+
+    clock = itertools.count()
+    monkeypatch.setattr(partition_heuristics, 'time', types.SimpleNamespace(monotonic=lambda: next(clock)))
+    groups, intra_weight, inter_weight = anneal_optimize_groups(compact_G, [5] * 6, time_limit=3, seed=1, cooling_rate=0.9)
+    assert (groups, intra_weight, inter_weight) == four_stages
+    assert intra_weight < full[1]
+    check_groups(groups, undirected_G, [5] * 6, intra_weight)
+
+
+@pytest.mark.parametrize("num_nodes, target_sizes, seed", LARGE_CASES)
+def test_heuristic_respects_sizes_and_improves_greedy_seed(num_nodes, target_sizes, seed):
+    undirected_G = convert_directed_to_undirected(random_preference_graph(num_nodes, seed))
+    compact_G = build_compact_graph(undirected_G)
+    seed_intra_weight = compact_G.group_weights(greedy_seed_groups(compact_G, target_sizes))[0]
+    # 時間上限為 0 時交換改善立即停止，仍返回合法的分組
+    for time_limit in (None, 0):
+        groups, intra_weight, _ = heuristic_optimize_groups(compact_G, target_sizes, time_limit)
+        check_groups(groups, undirected_G, target_sizes, intra_weight)
+        assert intra_weight >= seed_intra_weight
+
+
+def test_partition_memo_is_shared_through_the_cache_directory(tmp_path, monkeypatch):
+    # 背景回調的每個工作在新的行程中執行：以新的 SessionStore 模擬另一個行程，只能從目錄讀回結果
+    directed_G = random_preference_graph(8, 2)
+    monkeypatch.setattr(graph_utilities, '_partition_cache', SessionStore(directory=str(tmp_path)))
+    groups = graph_utilities.partition_groups(directed_G, [4, 4], 'option2')
+
+    def solve(*args, **kwargs):
+        raise AssertionError("the partition should come from the cache directory")
+
+    monkeypatch.setattr(graph_utilities, '_partition_cache', SessionStore(directory=str(tmp_path)))
+    monkeypatch.setattr(graph_utilities, 'optimize_graph_partition', solve)
+    monkeypatch.setattr(graph_utilities, 'partition_with_weight_adjustment', solve)
+    assert graph_utilities.partition_groups(directed_G, [4, 4], 'option2') == groups
+
+
+def test_more_students_than_group_sizes_is_rejected():
+    with pytest.raises(ValueError):
+        optimize_graph_partition(random_preference_graph(9, 1), [4, 4])
+
+
+@pytest.mark.parametrize("num_nodes, target_sizes, seed", CASES)
+def test_cpsat_matches_brute_force(num_nodes, target_sizes, seed):
+    pytest.importorskip('ortools')
+    directed_G = random_preference_graph(num_nodes, seed)
+    undirected_G = convert_directed_to_undirected(directed_G)
+    stats = {}
+    groups, intra_weight, _ = optimize_graph_partition(directed_G, target_sizes, time_limit=None, method='ilp', stats=stats)
+    assert stats['gap'] == 0.0
+    assert intra_weight == brute_force_intra_weight(undirected_G, target_sizes)
+    check_groups(groups, undirected_G, target_sizes, intra_weight)
@@ -0,0 +1,264 @@
+# utils/batch.py
+# 多班級批次分組：讀取一個活頁簿（每班一個工作表，或以班級欄區分），
+# 以行程池同時為各班男生、女生分組，並將所有結果寫入同一個輸出活頁簿。
+#
+# 命令列用法：
+#     python -m utils.batch classes.xlsx -o groups.xlsx --male-range 1 20 --female-range 21 40 \
+#         --male-groups 4,4,4,4,4 --female-groups 5,5,5,5
+#
+# 各班設定不同時，可在活頁簿中加入 settings（或「設定」）工作表（欄位見 SETTINGS_COLUMNS），
+# 沒有填寫的欄位使用命令列的預設值。
+import argparse
+import importlib.util
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import pandas as pd
+
+from utils.file_processing import validate_roster_chunks
+from utils.graph_utilities import (
+    PARTITION_TIME_LIMIT, PARTITION_WORKERS, SEARCH_WORKERS, calculate_group_weights, create_separate_directed_graphs,
+    optimize_graph_partition, partition_with_weight_adjustment,
+)
+from utils.validation import format_upload_report, is_valid, parse_group_sizes, validate_roster
+
+# 各班設定的工作表名稱與班級欄位名稱
+SETTINGS_SHEETS = ('settings', '設定')
+CLASS_COLUMNS = ('class', '班級')
+SETTINGS_COLUMNS = ['class', 'male_start', 'male_end', 'female_start', 'female_end', 'male_group_sizes', 'female_group_sizes']
+GENDERS = ('male', 'female')
+
+
+def _is_missing(value):
+    return value is None or (isinstance(value, float) and pd.isna(value))
+
+
+def read_class_rosters(path):
+    """
+    讀取多班級活頁簿，返回 ({班級: 名單 DataFrame}, {班級: 設定})。
+
+    - 有班級欄（class 或 班級）的工作表依該欄分成多個班級，其餘欄位依序為座號、順位1、順位2、順位3
+    - 沒有班級欄的工作表整張視為一個班級，以工作表名稱作為班級名稱
+    - settings（或「設定」）工作表為各班的範圍與組別大小設定，欄位見 SETTINGS_COLUMNS
+    """
+    engine = 'calamine' if importlib.util.find_spec('python_calamine') else None
+    sheets = pd.read_excel(path, sheet_name=None, engine=engine)
+
+    rosters, settings = {}, {}
+    for sheet_name, sheet in sheets.items():
+        if str(sheet_name).strip().lower() in SETTINGS_SHEETS:
+            for row in sheet.to_dict('records'):
+                settings[str(row['class'])] = {
+                    'male_range': (row.get('male_start'), row.get('male_end')),
+                    'female_range': (row.get('female_start'), row.get('female_end')),
+                    'male_group_sizes': parse_group_sizes(row.get('male_group_sizes')),
+                    'female_group_sizes': parse_group_sizes(row.get('female_group_sizes')),
+                }
+            continue
+        class_column = next((column for column in sheet.columns if str(column).strip().lower() in CLASS_COLUMNS), None)
+        if class_column is None:
+            rosters[str(sheet_name)] = sheet.iloc[:, :4]
+            continue
+        roster_columns = [column for column in sheet.columns if column != class_column][:4]
+        for class_name, class_sheet in sheet.groupby(class_column, sort=False):
+            rosters[str(class_name)] = class_sheet[roster_columns]
+    return rosters, settings
+
+
+def merge_settings(class_settings, defaults):
+    """以 defaults 補上班級設定中沒有填寫（None 或 NaN）的項目，範圍轉為整數 (start, end)"""
+    merged = {}
+    for gender in GENDERS:
+        start, end = class_settings.get(f'{gender}_range') or (None, None)
+        default_start, default_end = defaults.get(f'{gender}_range') or (None, None)
+        start = default_start if _is_missing(start) else start
+        end = default_end if _is_missing(end) else end
+        merged[f'{gender}_range'] = None if _is_missing(start) or _is_missing(end) else (int(start), int(end))
+        merged[f'{gender}_group_sizes'] = class_settings.get(f'{gender}_group_sizes') or defaults.get(f'{gender}_group_sizes')
+    return merged
+
+
+def _group_sizes_text(group_sizes, count):
+    """組別大小列表轉為 validate_roster 使用的字串；沒有該性別的學生時不需分組，視為「0」"""
+    if count == 0 and not group_sizes:
+        return "0"
+    return ", ".join(str(size) for size in group_sizes or [])
+
+
+def partition_class(class_name, roster, settings, method='exact', time_limit=PARTITION_TIME_LIMIT, preference_option='option1',
+                    search_workers=None):
+    """
+    為一個班級的男生、女生分組（在行程池的工作行程中執行）。
+    名單與網頁上傳的檔案經過相同的驗證：有問題的列（缺值、非整數、填寫自己等）、指向不存在座號的志願、
+    範圍外的座號、男女網絡相連或組別大小不符時，該班級記為失敗，不輸出分組。
+
+    參數:
+    - class_name: 班級名稱
+    - roster: 未整理的名單 DataFrame（座號、順位1、順位2、順位3 四欄）
+    - settings: merge_settings 的結果
+    - method: optimize_graph_partition 的搜尋方法
+    - time_limit: 每個性別的搜尋時間上限（秒）
+    - preference_option: 'option1' 不調整；'option2'/'option3' 與網頁相同，以逐步加權照顧孤立或人氣最低的學生
+    - search_workers: 大於 1 時每個性別的分支定界分散到多個行程搜尋（見 parallel_backtrack_optimize_groups）
+
+    返回:
+    - {'class', 'groups': {性別: {group_id: [st_id, ...]}}, 'summary': [每個性別的統計], 'seconds', 'error'}
+    """
+    start = time.perf_counter()
+    result = {'class': class_name, 'groups': {}, 'summary': [], 'seconds': 0.0, 'error': None}
+    try:
+        male_range, female_range = settings['male_range'], settings['female_range']
+        if male_range is None or female_range is None:
+            raise ValueError("Male and female ID ranges are required")
+        df, report = validate_roster_chunks([roster])
+        upload_problems = format_upload_report(report)
+        if upload_problems:
+            raise ValueError(upload_problems)
+
+        # 與網頁相同的驗證；先檢查兩個性別，避免只寫出一半的結果
+        counts = {gender: int(df['st_id'].between(*settings[f'{gender}_range']).sum()) for gender in GENDERS}
+        warning_message, validation_message, *group_checks = validate_roster(
+            df, *male_range, *female_range,
+            _group_sizes_text(settings['male_group_sizes'], counts['male']),
+            _group_sizes_text(settings['female_group_sizes'], counts['female'])
+        )
+        if not is_valid(warning_message, validation_message):
+            raise ValueError(warning_message or " ".join(check for check in group_checks if "Warning" in check))
+        graphs = dict(zip(GENDERS, create_separate_directed_graphs(df, male_range, female_range)))
+        tasks = [(gender, settings[f'{gender}_group_sizes'], counts[gender]) for gender in GENDERS if counts[gender]]
+
+        for gender, target_sizes, count in tasks:
+            gender_start = time.perf_counter()
+            G = graphs[gender]
+            # method='ilp' 時 stats['gap'] 為最優性差距
+            stats = {}
+            groups, _, _ = optimize_graph_partition(G, target_sizes, time_limit, workers=search_workers, method=method,
+                                                    stats=stats)
+            if preference_option in ('option2', 'option3'):
+                adjusted_groups = partition_with_weight_adjustment(G, target_sizes, groups, preference_option,
+                                                                   method=method, time_limit=time_limit, workers=search_workers)
+                # 加權調整後的分組不是 ILP 的解，最優性差距不再適用
+                if adjusted_groups != groups:
+                    stats.pop('gap', None)
+                groups = adjusted_groups
+            # 加權調整後的分組以原始（未加權）的圖計算權重
+            intra_weight, inter_weight = calculate_group_weights(groups, G)
+            result['groups'][gender] = groups
+            result['summary'].append({
+                'gender': gender,
+                'students': count,
+                'groups': len(target_sizes),
+                'intra_weight': intra_weight,
+                'inter_weight': inter_weight,
+                'gap': stats.get('gap'),
+                'seconds': time.perf_counter() - gender_start,
+            })
+    except Exception as e:
+        result['error'] = str(e)
+    result['seconds'] = time.perf_counter() - start
+    return result
+
+
+def partition_workbook(path, defaults=None, method='exact', time_limit=PARTITION_TIME_LIMIT, preference_option='option1',
+                       workers=None, progress=None, search_workers=None):
+    """
+    讀取多班級活頁簿並以行程池同時為每個班級分組。
+
+    參數:
+    - path: 輸入活頁簿的路徑（格式見 read_class_rosters）
+    - defaults: 各班共用的預設設定 {'male_range', 'female_range', 'male_group_sizes', 'female_group_sizes'}
+    - method / time_limit / preference_option: 傳給 partition_class
+    - workers: 行程數，None 表示使用 NETVIZ_PARTITION_WORKERS（未設定時為 CPU 核心數）
+    - progress: 可選的函數 progress(result)，每個班級完成時呼叫
+    - search_workers: 傳給 partition_class，None 表示使用 NETVIZ_SEARCH_WORKERS；班級已分散到 workers 個行程，
+      班級數少於核心數時才需要
+
+    返回:
+    - 依輸入順序排列的 partition_class 結果列表
+    """
+    rosters, settings = read_class_rosters(path)
+    defaults = defaults or {}
+    results = {}
+    if search_workers is None:
+        search_workers = SEARCH_WORKERS
+    with ProcessPoolExecutor(max_workers=workers or PARTITION_WORKERS or None) as pool:
+        futures = {
+            pool.submit(partition_class, class_name, roster, merge_settings(settings.get(class_name, {}), defaults),
+                        method, time_limit, preference_option, search_workers): class_name
+            for class_name, roster in rosters.items()
+        }
+        for future in as_completed(futures):
+            result = future.result()
+            results[futures[future]] = result
+            if progress is not None:
+                progress(result)
+    return [results[class_name] for class_name in rosters]
+
+
+def write_results(results, output_path):
+    """
+    將所有班級的分組寫入同一個活頁簿：
+    groups 工作表每位學生一列（class, gender, group, st_id），summary 工作表為各班各性別的統計與耗時
+    """
+    group_rows, summary_rows = [], []
+    for result in results:
+        for gender, groups in result['groups'].items():
+            for group_id, members in groups.items():
+                group_rows.extend({'class': result['class'], 'gender': gender, 'group': group_id + 1, 'st_id': st_id}
+                                  for st_id in sorted(members))
+        for summary in result['summary']:
+            summary_rows.append({'class': result['class'], **summary, 'error': None})
+        if result['error'] is not None:
+            summary_rows.append({'class': result['class'], 'seconds': result['seconds'], 'error': result['error']})
+
+    with pd.ExcelWriter(output_path, engine='openpyxl') as writer:
+        pd.DataFrame(group_rows, columns=['class', 'gender', 'group', 'st_id']).to_excel(writer, sheet_name='groups', index=False)
+        pd.DataFrame(summary_rows, columns=['class', 'gender', 'students', 'groups', 'intra_weight', 'inter_weight', 'gap', 'seconds', 'error']) \
+            .to_excel(writer, sheet_name='summary', index=False)
+
+
+def print_progress(result):
+    if result['error'] is not None:
+        print(f"{result['class']}: failed after {result['seconds']:.2f}s ({result['error']})")
+    else:
+        details = ", ".join(f"{summary['gender']} {summary['seconds']:.2f}s" for summary in result['summary'])
+        print(f"{result['class']}: {result['seconds']:.2f}s ({details})")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m utils.batch', description='Partition every class in a workbook into groups.')
+    parser.add_argument('input', help='workbook with one sheet per class, or a class column')
+    parser.add_argument('-o', '--output', help='output workbook (default: <input>_groups.xlsx)')
+    parser.add_argument('--male-range', nargs=2, type=int, metavar=('START', 'END'), help='default male ID range')
+    parser.add_argument('--female-range', nargs=2, type=int, metavar=('START', 'END'), help='default female ID range')
+    parser.add_argument('--male-groups', type=parse_group_sizes, help='default male group sizes, e.g. 4,4,4,4')
+    parser.add_argument('--female-groups', type=parse_group_sizes, help='default female group sizes, e.g. 4,4,4,4')
+    parser.add_argument('--method', default='exact', choices=['exact', 'heuristic', 'anneal', 'ilp'])
+    parser.add_argument('--time-limit', type=float, default=PARTITION_TIME_LIMIT, help='seconds per gender in each class')
+    parser.add_argument('--preference', default='option1', choices=['option1', 'option2', 'option3'])
+    parser.add_argument('--workers', type=int, help='number of worker processes')
+    parser.add_argument('--search-workers', type=int,
+                        help='processes for each exact search (default: NETVIZ_SEARCH_WORKERS, 0 for none)')
+    args = parser.parse_args(argv)
+
+    defaults = {
+        'male_range': tuple(args.male_range) if args.male_range else None,
+        'female_range': tuple(args.female_range) if args.female_range else None,
+        'male_group_sizes': args.male_groups,
+        'female_group_sizes': args.female_groups,
+    }
+    output = args.output or f"{os.path.splitext(args.input)[0]}_groups.xlsx"
+
+    start = time.perf_counter()
+    results = partition_workbook(args.input, defaults, args.method, args.time_limit, args.preference, args.workers, print_progress,
+                                 args.search_workers)
+    write_results(results, output)
+    failed = sum(result['error'] is not None for result in results)
+    print(f"{len(results)} classes in {time.perf_counter() - start:.2f}s ({failed} failed) -> {output}")
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
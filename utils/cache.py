@@ -0,0 +1,65 @@
+# utils/cache.py
+import threading
+from collections import OrderedDict
+
+
+class LRUCache:
+    """
+    執行緒安全的 LRU 快取，同時限制項目數量與估計的總大小（bytes），
+    超過任一上限時淘汰最久未使用的項目。
+    """
+
+    def __init__(self, max_entries=32, max_bytes=None):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._items = OrderedDict()  # key -> (value, size)
+        self._total_bytes = 0
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._items)
+
+    def __contains__(self, key):
+        with self._lock:
+            return key in self._items
+
+    @property
+    def total_bytes(self):
+        return self._total_bytes
+
+    def get(self, key, default=None):
+        """取出快取值並標記為最近使用，不存在時返回 default"""
+        with self._lock:
+            if key not in self._items:
+                return default
+            self._items.move_to_end(key)
+            return self._items[key][0]
+
+    def put(self, key, value, size=0):
+        """
+        存入快取值。size 為估計大小（bytes）；單一項目超過 max_bytes 時不快取。
+        """
+        with self._lock:
+            if key in self._items:
+                self._total_bytes -= self._items.pop(key)[1]
+            if self.max_bytes is not None and size > self.max_bytes:
+                return
+            self._items[key] = (value, size)
+            self._total_bytes += size
+            while len(self._items) > self.max_entries or (
+                    self.max_bytes is not None and self._total_bytes > self.max_bytes):
+                _, (_, evicted_size) = self._items.popitem(last=False)
+                self._total_bytes -= evicted_size
+
+    def pop(self, key, default=None):
+        with self._lock:
+            if key not in self._items:
+                return default
+            value, size = self._items.pop(key)
+            self._total_bytes -= size
+            return value
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+            self._total_bytes = 0
@@ -1,121 +1,181 @@
-import pandas as pd
-import networkx as nx
 import random
-from dash import dcc, html
+import time
+from dash import dcc, html, no_update, Patch
 from dash.dependencies import Input, Output, State
 from dash import callback_context
-from utils.graph_utilities import (
-    generate_cytoscape_elements,
-    generate_layout,
-    create_directed_graph,
-    apply_partition_and_color,
-    reset_elements_color
-)
-from utils.file_processing import process_uploaded_file
-import random
+from utils.cytoscape_style import generate_layout
+from utils.validation import VALIDATION_SUCCESS, check_range_overlap, format_upload_report, is_valid, validate_roster
+
+# pandas、NumPy、networkx 與分組工具（utils.graph_utilities、utils.file_processing）在各回調第一次執行時才匯入，
+# 讓伺服器啟動時只需載入 Dash
+
+def register_callbacks(app, background_manager=None):
+    """
+    註冊所有回調。
+
+    參數:
+    - app: Dash 應用
+    - background_manager: 可選的 Dash 背景回調管理器（例如 DiskcacheManager）。
+      提供時，分組計算與權重掃描改在背景工作中執行（分組另外回報進度）；輸入變更時 Dash 會終止仍在執行的舊工作。
+    """
+    graph_callback_options = {}
+    sweep_callback_options = {}
+    if background_manager is not None:
+        graph_callback_options = dict(
+            background=True,
+            manager=background_manager,
+            progress=[Output('solve-progress', 'children')],
+            running=[(Output('solve-progress', 'style'), {'display': 'block'}, {'display': 'none'})]
+        )
+        # 掃描期間停用按鈕，避免重複送出
+        sweep_callback_options = dict(
+            background=True,
+            manager=background_manager,
+            running=[(Output('sweep-button', 'disabled'), True, False)]
+        )
+
+    # 上傳的檔案只在這裡傳到伺服器一次：解析後存入工作階段快取，之後的回調只交換上傳 id
+    @app.callback(
+        Output('upload-id', 'data'),
+        Input('upload-data', 'contents')
+    )
+    def upload_file(contents):
+        from utils.file_processing import store_upload
 
-def register_callbacks(app):
+        if not contents:
+            return None
+        return store_upload(contents)
 
+    # 上傳檔案或男生/女生設定變更時只驗證一次，結果寫入 validation-store
     @app.callback(
-        Output('cytoscape', 'elements'),
-        [Input('upload-data', 'contents'),
+        Output('validation-store', 'data'),
+        [Input('upload-id', 'data'),
          Input('male-start', 'value'), Input('male-end', 'value'),
          Input('female-start', 'value'), Input('female-end', 'value'),
          Input('male-group-sizes', 'value'),  # 新增 male group sizes 輸入
-         Input('female-group-sizes', 'value'),  # 新增 female group sizes 輸入
+         Input('female-group-sizes', 'value')]  # 新增 female group sizes 輸入
+    )
+    def update_validation(upload_id, male_start, male_end, female_start, female_end, male_group_sizes, female_group_sizes):
+        return validation_result(upload_id, male_start, male_end, female_start, female_end, male_group_sizes, female_group_sizes)
+
+    @app.callback(
+        [Output('cytoscape', 'elements'),
+         Output('rendered-upload', 'data'),
+         Output('node-colors', 'data'),
+         Output('partition-error', 'children')],
+        [Input('validation-store', 'data'),
          Input('node-size-slider', 'value'),
          Input('update-color-button', 'n_clicks'),
          Input('preference-options', 'value')],
-        [State('cytoscape', 'elements'),
+        [State('rendered-upload', 'data'),
+         State('node-colors', 'data'),
          State('cytoscape', 'selectedNodeData'),
          State('cytoscape', 'selectedEdgeData'),
-         State('color-picker', 'value')]
+         State('color-picker', 'value')],
+        **graph_callback_options
     )
-    def update_graph(contents, male_start, male_end, female_start, female_end, male_group_sizes, female_group_sizes, node_size, n_clicks, preference_option, existing_elements, selected_nodes, selected_edges, color_value):
+    def update_graph(*args):
+        # 背景模式下 Dash 會在第一個參數傳入 set_progress
+        if background_manager is not None:
+            set_progress, *args = args
+            return render_graph(*args, progress_callback=make_progress_reporter(set_progress))
+        return render_graph(*args)
+
+    def render_graph(validation, node_size, n_clicks, preference_option, rendered_upload, node_colors, selected_nodes, selected_edges, color_value, progress_callback=None):
+        """
+        新上傳的檔案送出完整的元素列表；其他情況只以 Patch 送出有變更的節點顏色與大小，
+        伺服器不取回瀏覽器中的元素列表或檔案內容，而是依上傳 id 從工作階段快取取得資料與元素位置。
+        node-colors 保存目前每個節點的顏色，用來找出真正有變更的節點，並供分組結果顯示使用。
+        無法分組時保留目前的顏色，並在 partition-error 顯示原因。
+        """
+        from utils.file_processing import get_dataframe, get_element_index
+        from utils.graph_utilities import apply_node_colors, generate_cytoscape_elements, partition_node_colors, reset_node_colors
+
         triggered = callback_context.triggered[0]['prop_id'].split('.')[0]
-        
-        regen_triggers = [
-            'upload-data',
-            'male-start',
-            'male-end', 'male-end',
-            'female-start', 'female-end',
-            'male-group-sizes', 'female-group-sizes',
-            'preference-options'
-        ]
-        if triggered in regen_triggers:
-            # 使用共用的验证和警告函数
-            warning_message, validation_message, validation_style, male_group_check, female_group_check, df = validate_and_process_data(
-                contents, male_start, male_end, female_start, female_end, male_group_sizes, female_group_sizes
-            )
-            if df is not None:
-                if triggered == 'upload-data':
-                    # 生成 Cytoscape 元素
-                    existing_elements = generate_cytoscape_elements(df, node_size)
-
-                if validation_message == "Group size verification successful" and warning_message == "":
-                    # if triggered in ['preference-options', '']
-                    update_target = 'both'
-                    # if 'male-group-sizes' == triggered:
-                    #     update_target = 'male'
-                    # elif 'female-group-sizes' == triggered:
-                    #     update_target = 'female'
-
-                    existing_elements = apply_partition_and_color(
-                        df, (male_start, male_end), (female_start, female_end), 
-                        existing_elements, male_group_sizes, female_group_sizes, 
-                        preference_option, update_target
-                    )
-                else:
-                    update_target = 'both'
-                    if "Warning" not in male_group_check and warning_message == "":
-                        update_target = 'female'
-                    elif "Warning" not in female_group_check and warning_message == "":
-                        update_target = 'male'
-
-                    existing_elements = reset_elements_color(
-                        existing_elements, (male_start, male_end), 
-                        (female_start, female_end), update_target
+        if not validation or not validation['valid_upload']:
+            return no_update, no_update, no_update, no_update
+
+        # 解析結果與元素索引存放在伺服器端的工作階段快取
+        df = get_dataframe(validation['upload_key'])
+        element_index = get_element_index(validation['upload_key'])
+        if df is None:
+            return no_update, no_update, no_update, no_update
+        male_range, female_range = tuple(validation['male_range']), tuple(validation['female_range'])
+
+        elements = None
+        if validation['upload_key'] != rendered_upload:
+            # 新上傳的檔案：生成 Cytoscape 元素
+            elements = generate_cytoscape_elements(df, node_size)
+            rendered_upload = validation['upload_key']
+            node_colors = {element['data']['id']: element['data']['color'] for element in elements
+                           if 'source' not in element['data']}
+        node_colors = dict(node_colors or {})
+
+        regen_triggers = ['validation-store', 'preference-options']
+        changed_colors = {}
+        partition_error = no_update
+        if triggered in regen_triggers or elements is not None:
+            partition_error = ""
+            if is_validated(validation):
+                # if triggered in ['preference-options', '']
+                update_target = 'both'
+                # if 'male-group-sizes' == triggered:
+                #     update_target = 'male'
+                # elif 'female-group-sizes' == triggered:
+                #     update_target = 'female'
+
+                try:
+                    changed_colors = partition_node_colors(
+                        df, male_range, female_range,
+                        validation['male_group_sizes'], validation['female_group_sizes'],
+                        preference_option, update_target, progress_callback
                     )
+                except ValueError as e:
+                    partition_error = f"無法分組：{e}"
+            else:
+                update_target = 'both'
+                if "Warning" not in validation['male_group_check'] and validation['warning'] == "":
+                    update_target = 'female'
+                elif "Warning" not in validation['female_group_check'] and validation['warning'] == "":
+                    update_target = 'male'
 
-        # 处理节点大小或颜色变化
-        if triggered == 'node-size-slider':
-            for element in existing_elements:
-                if 'score' in element['data']:
-                    element['data']['score'] = node_size / 10
+                changed_colors = reset_node_colors(node_colors, male_range, female_range, update_target)
 
+        # 处理颜色变化（选取的节点与边）
         elif triggered == 'update-color-button':
-            if selected_nodes:
-                for node in selected_nodes:
-                    node_id = node['id']
-                    for element in existing_elements:
-                        if element['data'].get('id') == node_id:
-                            element['data']['color'] = color_value['hex']
-            if selected_edges:
-                for edge in selected_edges:
-                    edge_id = edge['id']
-                    for element in existing_elements:
-                        if element['data'].get('id') == edge_id:
-                            element['data']['color'] = color_value['hex']
-
-        return existing_elements
-    
+            changed_colors = {selected['id']: color_value['hex']
+                              for selected in (selected_nodes or []) + (selected_edges or [])}
+
+        if elements is not None:
+            apply_node_colors(elements, changed_colors, element_index)
+            node_colors.update((element_id, color) for element_id, color in changed_colors.items()
+                               if element_id in node_colors)
+            return elements, rendered_upload, node_colors, partition_error
+
+        elements, colors_patch = Patch(), Patch()
+        for element_id, color in changed_colors.items():
+            position = element_index.get(element_id)
+            # 節點顏色沒有變化時不送出；邊的顏色不在 node-colors 中，一律送出
+            if position is None or node_colors.get(element_id) == color:
+                continue
+            elements[position]['data']['color'] = color
+            if element_id in node_colors:
+                colors_patch[element_id] = color
+        # 处理节点大小变化
+        if triggered == 'node-size-slider':
+            for element_id in node_colors:
+                elements[element_index[element_id]]['data']['score'] = node_size / 10
+        return elements, no_update, colors_patch, partition_error
+
     @app.callback(
         [Output('warning', 'children'),
          Output('group-size-verification', 'children'),
          Output('group-size-verification', 'style')],
-        [Input('upload-data', 'contents'),
-         Input('male-start', 'value'), Input('male-end', 'value'),
-         Input('female-start', 'value'), Input('female-end', 'value'),
-         Input('male-group-sizes', 'value'),  # 新增 male group sizes 輸入
-         Input('female-group-sizes', 'value'),  # 新增 female group sizes 輸入
-         Input('update-color-button', 'n_clicks')]
+        Input('validation-store', 'data')
     )
-    def update_msg(contents, male_start, male_end, female_start, female_end, male_group_sizes, female_group_sizes, n_clicks):
-        # 直接调用共用的验证和警告函数
-        warning_message, validation_message, validation_style, _, _, _ = validate_and_process_data(
-            contents, male_start, male_end, female_start, female_end, male_group_sizes, female_group_sizes
-        )
-        return warning_message, validation_message, validation_style
+    def update_msg(validation):
+        # 直接讀取共用的驗證結果
+        return validation['warning'], validation['validation'], validation['style']
 
     @app.callback(
         [Output('advanced-settings-content', 'style'),
@@ -128,6 +188,15 @@ def register_callbacks(app):
         else:  # Even clicks -> hide settings
             return {'display': 'none'}, '網絡圖進階設定（展開）'
 
+    @app.callback(
+        Output('upload-report', 'children'),
+        Input('upload-id', 'data')
+    )
+    def display_upload_report(upload_id):
+        from utils.file_processing import get_upload_report
+
+        return format_upload_report(get_upload_report(upload_id))
+
     @app.callback(
         Output('file-name', 'children'),
         Input('upload-data', 'filename')
@@ -179,6 +248,8 @@ def register_callbacks(app):
         prevent_initial_call=True
     )
     def download_template(n_clicks):
+        import pandas as pd
+
         # 定義座號範圍
         group1 = list(range(1, 15))   # 1~14
         group2 = list(range(21, 35))  # 21~34
@@ -273,7 +344,7 @@ def register_callbacks(app):
     @app.callback(
         [Output('group-results', 'children'),
         Output('group-display', 'style')],
-        [Input('cytoscape', 'elements'),
+        [Input('node-colors', 'data'),
         Input('group-size-verification', 'children'),
         Input('warning', 'children'),
         Input('male-start', 'value'),
@@ -281,9 +352,9 @@ def register_callbacks(app):
         Input('female-start', 'value'),
         Input('female-end', 'value')]
     )
-    def display_group_results(elements, validation_message, warning_message, male_start, male_end, female_start, female_end):
+    def display_group_results(node_colors, validation_message, warning_message, male_start, male_end, female_start, female_end):
         # 當驗證成功且無警告時才顯示分組結果
-        if validation_message == "Group size verification successful" and warning_message == "":
+        if is_valid(warning_message, validation_message):
             
             # 男生和女生的範圍
             male_range = set(range(male_start, male_end + 1))
@@ -292,20 +363,19 @@ def register_callbacks(app):
             male_groups = {}
             female_groups = {}
 
-            # 先從elements提取節點並根據顏色進行分組
-            for element in elements:
-                if 'source' not in element['data']:
-                    node_id = int(element['data']['id'])  # 節點ID
-                    color = element['data'].get('color', 'none')  # 顏色標識分組
-                    
-                    if node_id in male_range:
-                        if color not in male_groups:
-                            male_groups[color] = []
-                        male_groups[color].append(node_id)
-                    elif node_id in female_range:
-                        if color not in female_groups:
-                            female_groups[color] = []
-                        female_groups[color].append(node_id)
+            # 根據節點顏色進行分組（node-colors 由繪圖回調維護，不必傳送整個元素列表）
+            for node_id, color in (node_colors or {}).items():
+                node_id = int(node_id)  # 節點ID
+                color = color or 'none'  # 顏色標識分組
+
+                if node_id in male_range:
+                    if color not in male_groups:
+                        male_groups[color] = []
+                    male_groups[color].append(node_id)
+                elif node_id in female_range:
+                    if color not in female_groups:
+                        female_groups[color] = []
+                    female_groups[color].append(node_id)
             
             # 合併顯示男生和女生的分組結果
             group_results_html = [
@@ -338,75 +408,128 @@ def register_callbacks(app):
         # 如果驗證失敗或有警告，則不顯示
         return "", {'display': 'none'}
     
-    # 回調處理節點事件（mouseoverNode）
+    # 權重掃描回調：一次比較多個加權倍數的分組
+    @app.callback(
+        Output('sweep-results', 'children'),
+        Input('sweep-button', 'n_clicks'),
+        [State('validation-store', 'data'),
+         State('sweep-rule', 'value')],
+        prevent_initial_call=True,
+        **sweep_callback_options
+    )
+    def run_weight_sweep(n_clicks, validation, rule):
+        from utils.file_processing import get_dataframe
+        from utils.graph_utilities import create_separate_directed_graphs, sweep_preference_weights
+
+        if not validation or not validation['valid_upload'] or not is_validated(validation):
+            return html.Div("請先上傳檔案並完成男生/女生設定", style={'color': 'red', 'font-size': '16px'})
+
+        df = get_dataframe(validation['upload_key'])
+        if df is None:
+            return html.Div("上傳的檔案已過期，請重新上傳", style={'color': 'red', 'font-size': '16px'})
+        G_male, G_female = create_separate_directed_graphs(df, tuple(validation['male_range']), tuple(validation['female_range']))
+        tables = []
+        for label, G, group_sizes in [("男生", G_male, validation['male_group_sizes']), ("女生", G_female, validation['female_group_sizes'])]:
+            target_sizes = [int(x.strip()) for x in group_sizes.split(',')]
+            tables.append(render_sweep_table(label, sweep_preference_weights(G, target_sizes, rule=rule)))
+        return tables
+
+    # 回調處理節點事件（mouseoverNode）：入邊/出邊由伺服器快取的鄰接索引查詢，只需 O(度數)
     @app.callback(
         Output('hover-info', 'children'),
         Input('cytoscape', 'tapNode'),
-        State('cytoscape', 'elements')
+        [State('rendered-upload', 'data'),
+         State('node-colors', 'data')]
     )
-    def display_node_edges_on_hover(node_data, elements):
+    def display_node_edges_on_hover(node_data, rendered_upload, node_colors):
+        from utils.file_processing import get_tap_adjacency
+
         if node_data:
             node_id = node_data['data']['id']
-            incoming_edges = [e for e in elements if 'target' in e['data'] and e['data']['target'] == node_id]
-            outgoing_edges = [e for e in elements if 'source' in e['data'] and e['data']['source'] == node_id]
+            adjacency = get_tap_adjacency(rendered_upload) if rendered_upload else None
+            if adjacency is None:
+                return html.Div(f"節點: {node_id}")
+            node_edges = adjacency.get(node_id, {'in': [], 'out': []})
+            node_colors = node_colors or {}
+
+            # 構造顯示的邊的描述，另一端節點以其分組顏色標示
+            def edge_info(source, target, rank, other):
+                return html.Span(f"{source} -> {target}（第{rank}順位）",
+                                 style={'color': node_colors.get(other, '#333'), 'margin-right': '10px'})
 
-            # 構造顯示的邊的描述
-            incoming_edges_info = [f"{e['data']['source']} -> {node_id}" for e in incoming_edges]
-            outgoing_edges_info = [f"{node_id} -> {e['data']['target']}" for e in outgoing_edges]
+            incoming_edges_info = [edge_info(source, node_id, rank, source) for source, rank in node_edges['in']]
+            outgoing_edges_info = [edge_info(node_id, target, rank, target) for target, rank in node_edges['out']]
 
             return [
                 html.Div(f"節點: {node_id}"),
-                html.Div(f"入邊: {', '.join(incoming_edges_info)}" if incoming_edges_info else "沒有入邊"),
-                html.Div(f"出邊: {', '.join(outgoing_edges_info)}" if outgoing_edges_info else "沒有出邊")
+                html.Div(["入邊: "] + incoming_edges_info if incoming_edges_info else "沒有入邊"),
+                html.Div(["出邊: "] + outgoing_edges_info if outgoing_edges_info else "沒有出邊")
             ]
         return ""
 
-# 檢查男生和女生範圍是否重疊
-def check_range_overlap(male_end, female_start):
-    if male_end >= female_start:
-        return "Error: Male and Female ranges overlap!"
-    return ""
-
-# 檢查是否有 st_id 不在定義的男生或女生範圍內
-def check_invalid_ids(df, male_start, male_end, female_start, female_end):
-    invalid_ids = df[~df['st_id'].between(male_start, male_end) & ~df['st_id'].between(female_start, female_end)]
-    if not invalid_ids.empty:
-        return f"Warning: Some st_id are outside the defined male or female ranges! Invalid st_id: {invalid_ids['st_id'].tolist()}."
-    return ""
-
-# 檢查男生和女生網絡是否連通
-def check_network_connection(G, male_nodes, female_nodes):
-    for male_node in male_nodes:
-        for female_node in female_nodes:
-            if nx.has_path(G, male_node, female_node) or nx.has_path(G, female_node, male_node):
-                return "Warning: Male and Female networks are connected!"
-    return ""
-
-def check_group_size(group_sizes_input, actual_count, group_label):
-    """
-    檢查group size是否符合實際人數
-    - group_sizes_input: 用戶輸入的組別大小 (string，如 "4, 4, 4, 2")
-    - actual_count: 實際的人數
-    - group_label: 組別標籤 (用於warning，例如 "Male" 或 "Female")
-
-    返回: 警告訊息，如果一切正常則返回空字串
-    """
-    if not group_sizes_input:
-        return f"Warning: {group_label} group sizes are empty!"
-    
-    try:
-        # 將用戶輸入的組別大小轉換為整數列表
-        group_sizes = [int(x.strip()) for x in group_sizes_input.split(',')]
-        # 計算組別大小的總和
-        total_group_size = sum(group_sizes)
-        if total_group_size != actual_count:
-            return f"Warning: {group_label} group sizes ({total_group_size}) do not match the actual count ({actual_count})!"
-        return f"{group_label} group size verification successful!"
-    except ValueError:
-        return f"Warning: Invalid {group_label} group sizes format!"
+# 權重掃描結果的表格，Pareto 分組以 ★ 標示
+def render_sweep_table(label, results):
+    cell_style = {'border': '1px solid #ccc', 'padding': '4px 8px', 'font-size': '14px'}
+    header = html.Tr([html.Th(title, style=cell_style) for title in ["倍數", "組內權重", "組間權重", "滿足人數", "Pareto", "分組"]])
+    rows = []
+    for result in results:
+        groups = sorted((sorted(members) for members in result['groups'].values() if members), key=min)
+        rows.append(html.Tr([
+            html.Td(", ".join(map(str, result['factors'])), style=cell_style),
+            html.Td(result['intra_weight'], style=cell_style),
+            html.Td(result['inter_weight'], style=cell_style),
+            html.Td(f"{result['satisfied']} / {result['boosted']}", style=cell_style),
+            html.Td("★" if result['pareto'] else "", style=cell_style),
+            html.Td(" | ".join(", ".join(map(str, members)) for members in groups), style=cell_style)
+        ]))
+    return html.Div([
+        html.H4(f"{label}分組", style={'font-size': '17px', 'font-weight': 'bold', 'margin': '10px 0 5px'}),
+        html.Table([header] + rows, style={'border-collapse': 'collapse', 'width': '100%'})
+    ])
+
+# 背景分組計算的進度訊息，最多每 interval 秒更新一次
+def make_progress_reporter(set_progress, interval=0.5):
+    labels = {'male': '男生', 'female': '女生'}
+    last_report = 0
+
+    def report(label, explored, best_intra_weight):
+        nonlocal last_report
+        now = time.monotonic()
+        if now - last_report < interval:
+            return
+        last_report = now
+        best = best_intra_weight if best_intra_weight != float('-inf') else '—'
+        set_progress((f"{labels.get(label, label)}分組計算中：已搜尋 {explored} 個狀態，目前最佳組內權重 {best}",))
+
+    return report
+
+# 驗證結果寫入 dcc.Store 的內容（只包含可序列化的資料）
+def validation_result(upload_id, male_start, male_end, female_start, female_end, male_group_sizes, female_group_sizes):
+    warning_message, validation_message, validation_style, male_group_check, female_group_check, df = validate_and_process_data(
+        upload_id, male_start, male_end, female_start, female_end, male_group_sizes, female_group_sizes
+    )
+    return {
+        'upload_key': upload_id,
+        'valid_upload': df is not None,
+        'warning': warning_message,
+        'validation': validation_message,
+        'style': validation_style,
+        'male_group_check': male_group_check,
+        'female_group_check': female_group_check,
+        'male_range': [male_start, male_end],
+        'female_range': [female_start, female_end],
+        'male_group_sizes': male_group_sizes,
+        'female_group_sizes': female_group_sizes,
+    }
+
+# 驗證成功且沒有警告時才進行分組
+def is_validated(validation):
+    return is_valid(validation['warning'], validation['validation'])
 
 # 通用的验证和警告函数
-def validate_and_process_data(contents, male_start, male_end, female_start, female_end, male_group_sizes, female_group_sizes):
+def validate_and_process_data(upload_id, male_start, male_end, female_start, female_end, male_group_sizes, female_group_sizes):
+    from utils.file_processing import get_dataframe, get_directed_graph
+
     warning_message = ""
     validation_message = ""
     male_group_check = ""
@@ -414,42 +537,18 @@ def validate_and_process_data(contents, male_start, male_end, female_start, fema
     validation_style = {'color': 'red'}
     df = None
 
-    # 检查范围是否重叠
-    warning_message += check_range_overlap(male_end, female_start)
-
-    if contents:
-        df = process_uploaded_file(contents)
-        if df is not None:
-            # 检查是否有 st_id 不在定义的范围内
-            warning_message += check_invalid_ids(df, male_start, male_end, female_start, female_end)
-            if warning_message:
-                return warning_message, validation_message, validation_style, male_group_check, female_group_check, df
-            # 使用男生和女生的范围过滤数据
-            df_male = df[df['st_id'].between(male_start, male_end)]
-            df_female = df[df['st_id'].between(female_start, female_end)]
-
-            # 生成有向图
-            G = create_directed_graph(df)
-
-            # 男生和女生的节点集合
-            male_nodes = set(df_male['st_id'])
-            female_nodes = set(df_female['st_id'])
-
-            # 检查男生和女生网络是否连接
-            warning_message += check_network_connection(G, male_nodes, female_nodes)
-
-            # 检查 group size 是否正确
-            male_count = len(df_male)
-            female_count = len(df_female)
-            male_group_check = check_group_size(male_group_sizes, male_count, "Male")
-            female_group_check = check_group_size(female_group_sizes, female_count, "Female")
-
-            # 检查结果
-            validation_message = f"{male_group_check} {female_group_check}"
-            if "Warning" not in validation_message:
-                validation_message = "Group size verification successful"
-                validation_style = {'color': 'green'}
-            else:
-                validation_style = {'color': 'red'}
+    if upload_id:
+        df = get_dataframe(upload_id)
+    if df is not None:
+        # 有向图与解析结果一同快取
+        warning_message, validation_message, male_group_check, female_group_check = validate_roster(
+            df, male_start, male_end, female_start, female_end, male_group_sizes, female_group_sizes,
+            lambda: get_directed_graph(upload_id)
+        )
+        if validation_message == VALIDATION_SUCCESS:
+            validation_style = {'color': 'green'}
+    else:
+        # 检查范围是否重叠
+        warning_message += check_range_overlap(male_end, female_start)
 
-    return warning_message, validation_message, validation_style, male_group_check, female_group_check, df
\ No newline at end of file
+    return warning_message, validation_message, validation_style, male_group_check, female_group_check, df
@@ -0,0 +1,155 @@
+# utils/compact_graph.py
+import numpy as np
+
+# 節點數不超過此值時額外建立稠密權重矩陣，較大的圖只保留 CSR 陣列
+DENSE_NODE_LIMIT = 512
+
+
+class CompactGraph:
+    """
+    以整數編號表示的無向加權圖，供分組搜尋的熱路徑使用。
+
+    屬性:
+    - nodes: 編號 -> 原始節點（學生座號）
+    - index: 原始節點 -> 編號
+    - indptr, indices, weights: CSR 格式的對稱鄰接陣列（不含自環邊），每列的 indices 已排序
+    - dense: 稠密權重矩陣 (n x n)，第一次讀取時才建立；節點數超過 dense_limit 時為 None
+    - self_loop_weight: 自環邊權重總和（永遠屬於組內權重）
+    """
+
+    def __init__(self, nodes, indptr, indices, weights, self_loop_weight=0, dense_limit=DENSE_NODE_LIMIT):
+        self.nodes = list(nodes)
+        self.index = {node: i for i, node in enumerate(self.nodes)}
+        self.indptr = indptr
+        self.indices = indices
+        self.weights = weights
+        self.self_loop_weight = self_loop_weight
+        self.dense_limit = dense_limit
+        self._dense = None
+        self._adjacency = None
+
+    def __len__(self):
+        return len(self.nodes)
+
+    def rows(self):
+        """每個 CSR 項目所屬的列（來源節點編號）"""
+        return np.repeat(np.arange(len(self.nodes)), np.diff(self.indptr))
+
+    def neighbors(self, i):
+        """節點 i 的鄰居編號與邊權重（CSR 切片，不複製）"""
+        start, end = self.indptr[i], self.indptr[i + 1]
+        return self.indices[start:end], self.weights[start:end]
+
+    @property
+    def dense(self):
+        """
+        稠密權重矩陣 (n x n)，只有交換改善（整列讀取權重）會用到，第一次讀取時才建立並快取；
+        節點數超過 dense_limit 時為 None
+        """
+        if self._dense is None and len(self.nodes) <= self.dense_limit:
+            self._dense = np.zeros((len(self.nodes), len(self.nodes)), dtype=self.weights.dtype)
+            self._dense[self.rows(), self.indices] = self.weights
+        return self._dense
+
+    def weighted_degree(self):
+        """每個節點的加權度數（不含自環邊）"""
+        return np.bincount(self.rows(), weights=self.weights, minlength=len(self.nodes))
+
+    def adjacency_lists(self):
+        """
+        以 Python 串列表示的鄰接表 [[(j, w), ...], ...]，只建立一次後快取。
+        純 Python 的搜尋迴圈逐一讀取 NumPy 純量反而較慢，因此熱路徑讀取此串列。
+        """
+        if self._adjacency is None:
+            indices = self.indices.tolist()
+            weights = self.weights.tolist()
+            indptr = self.indptr.tolist()
+            self._adjacency = [list(zip(indices[indptr[i]:indptr[i + 1]], weights[indptr[i]:indptr[i + 1]]))
+                               for i in range(len(self.nodes))]
+        return self._adjacency
+
+    def add_weights(self, sources, targets, deltas):
+        """
+        就地增加邊權重（兩個方向同時更新），供逐步加權的重新分組共用同一張圖。
+        邊必須已存在於圖中；sources == targets 的項目加到自環邊權重。
+
+        參數:
+        - sources, targets: 邊兩端的節點編號陣列
+        - deltas: 每條邊增加的權重
+        """
+        sources, targets, deltas = np.asarray(sources), np.asarray(targets), np.asarray(deltas)
+        self_loop = sources == targets
+        self.self_loop_weight += deltas[self_loop].sum().item()
+        sources, targets, deltas = sources[~self_loop], targets[~self_loop], deltas[~self_loop]
+
+        # CSR 項目依 (列, 欄) 排序，以 列 * n + 欄 的鍵值二分搜尋各邊的位置
+        n = len(self.nodes)
+        keys = self.rows() * n + self.indices
+        forward = np.searchsorted(keys, sources * n + targets)
+        backward = np.searchsorted(keys, targets * n + sources)
+        if self.weights.dtype.kind != 'f' and deltas.dtype.kind == 'f':
+            self.weights = self.weights.astype(np.float64)
+        # 同一條邊可能出現多次（例如雙向邊），以 np.add.at 累加
+        np.add.at(self.weights, forward, deltas)
+        np.add.at(self.weights, backward, deltas)
+        # 衍生的稠密矩陣與鄰接串列在下次讀取時重建
+        self._dense = None
+        self._adjacency = None
+
+    def group_weights(self, assignment):
+        """
+        依節點編號 -> 組別的陣列計算組內與組間邊權重。
+
+        參數:
+        - assignment: 長度為 n 的組別編號序列
+
+        返回:
+        - (intra_group_weight, inter_group_weight)
+        """
+        assignment = np.asarray(assignment)
+        same_group = assignment[self.rows()] == assignment[self.indices]
+        intra_group_weight = self.weights[same_group].sum().item()
+        inter_group_weight = self.weights[~same_group].sum().item()
+        # CSR 為對稱儲存，每條邊出現兩次
+        if self.weights.dtype.kind == 'f':
+            return intra_group_weight / 2 + self.self_loop_weight, inter_group_weight / 2
+        return intra_group_weight // 2 + self.self_loop_weight, inter_group_weight // 2
+
+
+def build_compact_graph(undirected_G, dense_limit=DENSE_NODE_LIMIT):
+    """
+    將 convert_directed_to_undirected 產生的無向圖轉換為 CompactGraph
+
+    參數:
+    - undirected_G: NetworkX 無向圖，邊帶有 'weight' 屬性
+    - dense_limit: 節點數不超過此值時才允許建立稠密權重矩陣
+
+    返回:
+    - CompactGraph
+    """
+    nodes = list(undirected_G.nodes())
+    index = {node: i for i, node in enumerate(nodes)}
+
+    sources, targets, edge_weights = [], [], []
+    self_loop_weight = 0
+    for u, v, weight in undirected_G.edges(data='weight'):
+        if u == v:
+            self_loop_weight += weight
+            continue
+        sources.append(index[u])
+        targets.append(index[v])
+        edge_weights.append(weight)
+
+    # 對稱儲存：每條邊的兩個方向各一筆，依 (列, 欄) 排序
+    rows = np.array(sources + targets, dtype=np.int64)
+    cols = np.array(targets + sources, dtype=np.int64)
+    weights = np.array(edge_weights + edge_weights)
+    if weights.dtype.kind not in 'iuf':
+        weights = weights.astype(np.float64)
+    order = np.lexsort((cols, rows))
+    rows, cols, weights = rows[order], cols[order], weights[order]
+
+    indptr = np.zeros(len(nodes) + 1, dtype=np.int64)
+    np.cumsum(np.bincount(rows, minlength=len(nodes)), out=indptr[1:])
+
+    return CompactGraph(nodes, indptr, cols, weights, self_loop_weight, dense_limit)
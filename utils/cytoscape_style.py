@@ -0,0 +1,53 @@
+# utils/cytoscape_style.py
+# Cytoscape 的樣式與佈局設定（只有純資料，不依賴 NumPy/networkx，啟動時建立版面用）
+
+def get_default_stylesheet():
+    return [
+        {
+            'selector': 'node',
+            'style': {
+                'label': 'data(label)',
+                'width': 'mapData(score, 0, 1, 20, 60)',
+                'height': 'mapData(score, 0, 1, 20, 60)',
+                'font-size': '10px',
+                'text-valign': 'center',
+                'text-halign': 'center',
+                'background-color': 'data(color)'
+            }
+        },
+        {
+            'selector': 'node:selected',
+            'style': {
+                'border-width': '2px',
+                'border-color': '#877F6C',
+                'overlay-opacity': 0.2
+            }
+        },
+        {
+            'selector': 'edge',
+            'style': {
+                'line-color': 'data(color)',
+                'target-arrow-color': 'data(color)',
+                'target-arrow-shape': 'triangle',
+                'curve-style': 'bezier',
+                'opacity': 0.8,
+                'arrow-scale': 1.2,
+                'width': f'mapData(weight, 0, 1, 0, 5)'
+            }
+        },
+        {
+            'selector': 'edge:selected',
+            'style': {
+                'border-width': '2px',
+                'border-color': '#877F6C',
+                'background-color': '#877F6C',
+                'overlay-opacity': 0.2
+            }
+        }
+    ]
+
+def generate_layout(layout_value, seed, node_repulsion):
+    layout = {'name': layout_value, 'randomize': True, 'seed': seed}
+    if layout_value == 'cose':
+        layout['nodeRepulsion'] = node_repulsion * 10000
+    return layout
@@ -1,18 +1,355 @@
 # utils/file_processing.py
 import pandas as pd
+import numpy as np
+import importlib.util
 import io
+import os
 import base64
+import hashlib
 
-def process_uploaded_file(contents):
-    content_type, content_string = contents.split(',')
-    decoded = base64.b64decode(content_string)
-    
+from utils.session_store import SessionStore
+from utils.graph_utilities import build_tap_adjacency, create_directed_graph, cytoscape_element_index
+
+# 上傳檔案解析結果的快取上限：同一份檔案只解碼、解析一次
+UPLOAD_CACHE_MAX_ENTRIES = 16
+UPLOAD_CACHE_MAX_BYTES = 256 * 1024 * 1024
+# networkx 有向圖每條邊約略佔用的記憶體（bytes），用於估計快取大小
+GRAPH_BYTES_PER_EDGE = 500
+# 點選節點用的鄰接索引每條邊約略佔用的記憶體（bytes）
+ADJACENCY_BYTES_PER_EDGE = 200
+# 名單的欄位名稱（依序對應 座號、順位1、順位2、順位3）
+ROSTER_COLUMNS = ['st_id', 'order1', 'order2', 'order3']
+# 各種上傳格式的檔頭
+XLSX_MAGIC = b'PK\x03\x04'
+XLS_MAGIC = b'\xd0\xcf\x11\xe0'
+PARQUET_MAGIC = b'PAR1'
+# 元素索引每個元素約略佔用的記憶體（bytes）
+ELEMENT_INDEX_BYTES_PER_ELEMENT = 100
+# 串流讀取名單時每批處理的列數，限制解析時的記憶體高峰
+ROSTER_CHUNK_ROWS = 5000
+# 錯誤報告最多列出的問題列數（各原因的總數仍完整統計）
+MAX_REPORTED_ROW_ERRORS = 100
+# 問題列的原因：缺值、非整數、超出 int64 範圍、填寫自己、志願重複、座號重複
+ROW_ERROR_REASONS = ('missing', 'non_integer', 'out_of_range', 'self_reference', 'duplicate_choice', 'duplicate_id')
+# 座號與志願以 int64 儲存，絕對值達到 2**63 的數值無法轉換
+INT64_LIMIT = float(2 ** 63)
+
+# 上傳檔案的工作階段資料：最後一次使用後 NETVIZ_SESSION_TTL 秒過期，
+# 並備份到 NETVIZ_SESSION_DIR（預設 ./cache/sessions），讓其他行程或重啟後的伺服器也能讀回
+SESSION_TTL = int(os.environ.get('NETVIZ_SESSION_TTL', '3600'))
+SESSION_DIR = os.environ.get('NETVIZ_SESSION_DIR', os.path.join(os.environ.get('NETVIZ_CACHE_DIR', './cache'), 'sessions'))
+
+_upload_cache = SessionStore(max_entries=UPLOAD_CACHE_MAX_ENTRIES, max_bytes=UPLOAD_CACHE_MAX_BYTES,
+                             ttl=SESSION_TTL, directory=SESSION_DIR or None)
+
+def upload_key(contents):
+    """以上傳內容的雜湊值作為快取鍵"""
+    return hashlib.sha256(contents.encode()).hexdigest()
+
+def detect_format(data):
+    """依檔頭判斷上傳檔案的格式：'xlsx'、'xls'、'parquet'，其他視為 'csv'"""
+    if data.startswith(XLSX_MAGIC):
+        return 'xlsx'
+    if data.startswith(XLS_MAGIC):
+        return 'xls'
+    if data.startswith(PARQUET_MAGIC):
+        return 'parquet'
+    return 'csv'
+
+def read_roster(data, file_format=None):
+    """
+    讀取名單檔案（未整理的原始表格）。有安裝 python-calamine 時以它讀取 Excel，
+    有安裝 pyarrow 時以 pyarrow 引擎讀取 CSV；Parquet 需要 pyarrow（或 fastparquet）。
+
+    參數:
+    - data: 檔案內容 (bytes)
+    - file_format: 'xlsx'、'xls'、'csv' 或 'parquet'，None 表示依檔頭判斷
+    """
+    file_format = file_format or detect_format(data)
+    buffer = io.BytesIO(data)
+    if file_format in ('xlsx', 'xls'):
+        engine = 'calamine' if importlib.util.find_spec('python_calamine') else None
+        return pd.read_excel(buffer, engine=engine)
+    if file_format == 'parquet':
+        return pd.read_parquet(buffer)
+    if file_format == 'csv':
+        engine = 'pyarrow' if importlib.util.find_spec('pyarrow') else 'c'
+        return pd.read_csv(buffer, engine=engine)
+    raise ValueError(f"Unsupported file format: {file_format}")
+
+def _compact_int_dtype(values):
+    """足以容納 values 中所有整數的最小整數型態（int16/int32/int64）"""
+    for dtype in (np.int16, np.int32):
+        info = np.iinfo(dtype)
+        if values.size == 0 or (values.min() >= info.min and values.max() <= info.max):
+            return dtype
+    return np.int64
+
+def _batched(rows, chunk_rows):
+    """將逐列的 tuple 每 chunk_rows 列組成一個四欄的 DataFrame；空字串視為缺值"""
+    batch = []
+    for row in rows:
+        batch.append([None if value == '' else value for value in row[:len(ROSTER_COLUMNS)]])
+        if len(batch) == chunk_rows:
+            yield pd.DataFrame(batch)
+            batch = []
+    if batch:
+        yield pd.DataFrame(batch)
+
+def _excel_rows(buffer):
+    """逐列讀取 xlsx 第一個工作表（不含標題列）：有 python-calamine 時使用它，否則使用 openpyxl 的 read_only 模式"""
+    if importlib.util.find_spec('python_calamine'):
+        from python_calamine import CalamineWorkbook
+        rows = CalamineWorkbook.from_filelike(buffer).get_sheet_by_index(0).iter_rows()
+        next(rows, None)
+        yield from rows
+        return
+    from openpyxl import load_workbook
+    workbook = load_workbook(buffer, read_only=True, data_only=True)
     try:
-        df = pd.read_excel(io.BytesIO(decoded), dtype={'座號': 'str', '順位1': 'str', '順位2': 'str'})
-        df.columns = ['st_id', 'order1', 'order2', 'order3']
-        df.dropna(inplace=True)
-        df = df.astype(int)  # 確保轉換為整數型態
-        return df
+        yield from workbook.worksheets[0].iter_rows(min_row=2, values_only=True)
+    finally:
+        workbook.close()
+
+def iter_roster_chunks(data, file_format=None, chunk_rows=ROSTER_CHUNK_ROWS):
+    """
+    分批讀取名單檔案，每批產生一個未整理的 DataFrame（至少四欄，依序為座號、順位1、順位2、順位3）。
+    xlsx 逐列讀取，CSV 以 chunksize 分批，Parquet 有 pyarrow 時依 row group 分批；
+    舊版 xls 無法串流，整份讀取為一批。
+
+    參數:
+    - data: 檔案內容 (bytes)
+    - file_format: 'xlsx'、'xls'、'csv' 或 'parquet'，None 表示依檔頭判斷
+    - chunk_rows: 每批的列數
+    """
+    file_format = file_format or detect_format(data)
+    buffer = io.BytesIO(data)
+    if file_format == 'xlsx':
+        yield from _batched(_excel_rows(buffer), chunk_rows)
+    elif file_format == 'csv':
+        # pandas 的 pyarrow 引擎不支援 chunksize；pyarrow 的串流讀取器須以字串讀入再轉換（避免各區塊型態不一），
+        # 比 C 引擎直接解析整數慢，因此分批讀取 CSV 一律使用 C 引擎
+        yield from pd.read_csv(buffer, chunksize=chunk_rows)
+    elif file_format == 'parquet' and importlib.util.find_spec('pyarrow'):
+        import pyarrow.parquet as pq
+        for batch in pq.ParquetFile(buffer).iter_batches(batch_size=chunk_rows):
+            yield batch.to_pandas()
+    else:
+        yield read_roster(data, file_format)
+
+def validate_roster_chunk(chunk, first_row):
+    """
+    驗證一批名單列，返回可用的列與每列的問題原因。
+    原因依序檢查：missing（有缺值）、non_integer（不是整數）、out_of_range（超出 int64 範圍）、
+    self_reference（志願填寫自己）、duplicate_choice（同一位同學填了兩次以上）；
+    整列空白的列直接略過，不視為錯誤。座號重複需要整份名單，由 read_roster_streaming 最後檢查。
+
+    參數:
+    - chunk: iter_roster_chunks 產生的 DataFrame
+    - first_row: 這批第一列在檔案中的列號（標題列為第 1 列）
+
+    返回:
+    - values: 通過驗證的列，形狀 (n, 4) 的 int64 陣列
+    - rows: values 每列在檔案中的列號
+    - errors: [(列號, 原因), ...]
+    """
+    if chunk.shape[1] < len(ROSTER_COLUMNS):
+        raise ValueError(f"Expected {len(ROSTER_COLUMNS)} columns (st_id, order1, order2, order3), got {chunk.shape[1]}")
+    raw = chunk.iloc[:, :len(ROSTER_COLUMNS)]
+    missing_cells = raw.isna().to_numpy()
+    numeric = np.column_stack([pd.to_numeric(raw.iloc[:, j], errors='coerce').to_numpy(dtype=float)
+                               for j in range(len(ROSTER_COLUMNS))])
+
+    blank = missing_cells.all(axis=1)
+    missing = missing_cells.any(axis=1) & ~blank
+    with np.errstate(invalid='ignore'):
+        non_integer = ~missing_cells.any(axis=1) & (np.isnan(numeric) | (np.mod(numeric, 1) != 0)).any(axis=1)
+        out_of_range = (np.abs(numeric) >= INT64_LIMIT).any(axis=1)
+        self_reference = (numeric[:, 1:] == numeric[:, :1]).any(axis=1)
+        choices = numeric[:, 1:]
+        duplicate_choice = ((choices[:, 0] == choices[:, 1]) | (choices[:, 0] == choices[:, 2]) |
+                            (choices[:, 1] == choices[:, 2]))
+    rejected = missing | non_integer | out_of_range | self_reference | duplicate_choice
+    accepted = ~(blank | rejected)
+
+    # 只對有問題的列決定原因（依 ROW_ERROR_REASONS 的優先順序）
+    reasons = np.select([missing[rejected], non_integer[rejected], out_of_range[rejected], self_reference[rejected]],
+                        ['missing', 'non_integer', 'out_of_range', 'self_reference'], 'duplicate_choice')
+    errors = list(zip((np.flatnonzero(rejected) + first_row).tolist(), reasons.tolist()))
+    row_numbers = np.arange(first_row, first_row + len(raw), dtype=np.int64)
+    return numeric[accepted].astype(np.int64), row_numbers[accepted], errors
+
+def empty_upload_report(file_format=None):
+    """尚未讀取任何列的錯誤報告（欄位說明見 read_roster_streaming）"""
+    return {
+        'format': file_format,
+        'rows': 0,
+        'accepted': 0,
+        'dropped': 0,
+        'counts': {reason: 0 for reason in ROW_ERROR_REASONS},
+        'errors': [],
+        'unknown_targets': 0,
+        'target_errors': [],
+        'error': None,
+    }
+
+def read_roster_streaming(data, file_format=None, chunk_rows=ROSTER_CHUNK_ROWS):
+    """
+    分批讀取並驗證名單，丟棄有問題的列，返回整理好的 DataFrame 與錯誤報告（見 validate_roster_chunks）。
+    每批只保留通過驗證的整數陣列，記憶體高峰約為一批原始資料加上最終的整數表格。
+
+    參數:
+    - data: 檔案內容 (bytes)
+    - file_format: 'xlsx'、'xls'、'csv' 或 'parquet'，None 表示依檔頭判斷
+    - chunk_rows: 每批的列數
+    """
+    file_format = file_format or detect_format(data)
+    return validate_roster_chunks(iter_roster_chunks(data, file_format, chunk_rows), file_format)
+
+def validate_roster_chunks(chunks, file_format=None):
+    """
+    逐批驗證未整理的名單表格（座號、順位1、順位2、順位3 四欄），丟棄有問題的列，
+    返回整理好的 DataFrame 與錯誤報告。上傳檔案與批次分組的活頁簿共用這個驗證。
+
+    參數:
+    - chunks: 未整理 DataFrame 的可迭代物件（例如 iter_roster_chunks 的結果，或 [整張工作表]）
+    - file_format: 寫入報告的格式名稱
+
+    返回:
+    - df: st_id/order1/order2/order3 四欄的整數 DataFrame，無法讀取時為 None
+    - report: 錯誤報告 {'format', 'rows', 'accepted', 'dropped', 'counts': {原因: 列數},
+      'errors': [{'row': 列號, 'reason': 原因}, ...]（最多 MAX_REPORTED_ROW_ERRORS 筆）,
+      'unknown_targets': 指向名單中不存在座號的志願數,
+      'target_errors': [{'row': 列號, 'st_id': 座號, 'target': 志願}, ...]（最多 MAX_REPORTED_ROW_ERRORS 筆）,
+      'error': 無法讀取時的訊息}
+      指向不存在座號（例如被丟棄的列）的志願不會被移除，validate_roster 會以警告阻止分組
+    """
+    report = empty_upload_report(file_format)
+    errors = []
+    parts, row_parts = [], []
+    first_row = 2  # 第 1 列為標題列
+    try:
+        for chunk in chunks:
+            values, rows, chunk_errors = validate_roster_chunk(chunk, first_row)
+            first_row += len(chunk)
+            parts.append(values)
+            row_parts.append(rows)
+            for row, reason in chunk_errors:
+                report['counts'][reason] += 1
+                if len(errors) < MAX_REPORTED_ROW_ERRORS:
+                    errors.append((row, reason))
+    except Exception as e:
+        report['error'] = str(e)
+        return None, report
+
+    values = np.concatenate(parts) if parts else np.empty((0, len(ROSTER_COLUMNS)), dtype=np.int64)
+    rows = np.concatenate(row_parts) if row_parts else np.empty(0, dtype=np.int64)
+    # 座號重複時保留第一次出現的列
+    duplicated = pd.Series(values[:, 0]).duplicated().to_numpy()
+    report['counts']['duplicate_id'] = int(duplicated.sum())
+    errors += [(row, 'duplicate_id') for row in rows[duplicated][:MAX_REPORTED_ROW_ERRORS].tolist()]
+    values = values[~duplicated]
+    rows = rows[~duplicated]
+
+    # 志願指向保留的名單中不存在的座號（包含被丟棄的列），否則分組時會多出不存在的學生
+    unknown = ~np.isin(values[:, 1:], values[:, 0])
+    report['unknown_targets'] = int(unknown.sum())
+    target_rows, target_columns = np.nonzero(unknown)
+    report['target_errors'] = [
+        {'row': int(rows[i]), 'st_id': int(values[i, 0]), 'target': int(values[i, j + 1])}
+        for i, j in zip(target_rows[:MAX_REPORTED_ROW_ERRORS].tolist(), target_columns[:MAX_REPORTED_ROW_ERRORS].tolist())
+    ]
+
+    report['rows'] = first_row - 2
+    report['accepted'] = len(values)
+    report['dropped'] = sum(report['counts'].values())
+    # 各原因各自保留前 MAX_REPORTED_ROW_ERRORS 筆，合併排序後的前幾筆即為整份檔案最前面的問題列
+    report['errors'] = [{'row': row, 'reason': reason} for row, reason in sorted(errors)[:MAX_REPORTED_ROW_ERRORS]]
+    df = pd.DataFrame(values.astype(_compact_int_dtype(values)), columns=ROSTER_COLUMNS)
+    return df, report
+
+def parse_uploaded_file(contents):
+    """
+    解析上傳的 dcc.Upload 內容（data URL），返回 (DataFrame, 錯誤報告)，格式同 read_roster_streaming
+    """
+    try:
+        content_type, content_string = contents.split(',')
+        decoded = base64.b64decode(content_string)
     except Exception as e:
-        print(e)
+        report = empty_upload_report()
+        report['error'] = str(e)
+        return None, report
+    return read_roster_streaming(decoded)
+
+def _entry_size(entry):
+    size = entry['contents_size']
+    if entry['df'] is not None:
+        size += int(entry['df'].memory_usage(deep=True).sum())
+    if entry['graph'] is not None:
+        size += entry['graph'].number_of_edges() * GRAPH_BYTES_PER_EDGE
+    if entry['adjacency'] is not None:
+        size += len(entry['df']) * 3 * ADJACENCY_BYTES_PER_EDGE
+    if entry['element_index'] is not None:
+        size += len(entry['element_index']) * ELEMENT_INDEX_BYTES_PER_ELEMENT
+    return size
+
+def store_upload(contents):
+    """
+    解析上傳的檔案並存入工作階段快取，返回上傳 id（內容的雜湊值）。
+    之後的回調只需傳遞這個 id，不必再傳送檔案內容；同一份檔案只解析一次。
+    """
+    key = upload_key(contents)
+    if _upload_cache.get(key) is None:
+        df, report = parse_uploaded_file(contents)
+        entry = {'df': df, 'report': report, 'graph': None, 'adjacency': None, 'element_index': None, 'contents_size': len(contents)}
+        _upload_cache.put(key, entry, _entry_size(entry))
+    return key
+
+def _derived(key, name, build):
+    """取得上傳項目中的衍生資料（必要時以 build(df) 建立並存回），項目不存在或解析失敗時返回 None"""
+    entry = _upload_cache.get(key) if key else None
+    if entry is None or entry['df'] is None:
         return None
+    if entry[name] is None:
+        entry[name] = build(entry['df'])
+        # 重新存入以更新估計大小
+        _upload_cache.put(key, entry, _entry_size(entry))
+    return entry[name]
+
+def get_dataframe(key):
+    """
+    返回上傳 id 對應的 DataFrame；解析失敗、已過期或不存在時返回 None。
+    返回的 DataFrame 為共用物件，呼叫端不可就地修改。
+    """
+    entry = _upload_cache.get(key) if key else None
+    return None if entry is None else entry['df']
+
+def get_upload_report(key):
+    """返回上傳 id 對應的錯誤報告（read_roster_streaming），不存在時返回 None"""
+    entry = _upload_cache.get(key) if key else None
+    return None if entry is None else entry['report']
+
+def process_uploaded_file(contents):
+    """
+    解析上傳的名單檔案（Excel、CSV 或 Parquet）並返回 DataFrame，解析失敗時返回 None。
+    結果依內容雜湊快取，返回的 DataFrame 為共用物件，呼叫端不可就地修改。
+    """
+    return get_dataframe(store_upload(contents))
+
+def get_directed_graph(key):
+    """
+    返回上傳 id 對應的完整有向圖（create_directed_graph），與解析結果一起快取。
+    返回的圖為共用物件，呼叫端不可就地修改；解析失敗或不存在時返回 None。
+    """
+    return _derived(key, 'graph', create_directed_graph)
+
+def get_tap_adjacency(key):
+    """
+    返回上傳 id 對應的 build_tap_adjacency 結果，與解析結果一起快取。
+    點選節點時只需傳送 id，不必傳送檔案內容或元素列表；不存在時返回 None。
+    """
+    return _derived(key, 'adjacency', build_tap_adjacency)
+
+def get_element_index(key):
+    """返回上傳 id 對應的 cytoscape_element_index 結果，供 Patch 更新定位元素；不存在時返回 None"""
+    return _derived(key, 'element_index', cytoscape_element_index)
@@ -1,82 +1,122 @@
 # utils/graph_utilities.py
-import pandas as pd
-import matplotlib.pyplot as plt
-import matplotlib.cm as cm
-import matplotlib.colors as mcolors  # 匯入正確的 colors 模組
+import hashlib
+import multiprocessing
+import os
+import sys
+import time
+from concurrent.futures import Future, ProcessPoolExecutor
 import networkx as nx
+import numpy as np
+
+from utils.compact_graph import CompactGraph, build_compact_graph
+from utils.cytoscape_style import generate_layout, get_default_stylesheet
+from utils.ilp_partition import ilp_optimize_groups
+from utils.partition_heuristics import WARM_START_FRACTION, anneal_optimize_groups, heuristic_optimize_groups
+from utils.session_store import SessionStore
+
+# 偏好順位欄位及其對應的邊權重
+ORDER_COLUMNS = ['order1', 'order2', 'order3']
+ORDER_WEIGHTS = [3, 2, 1]
+
+# 分組搜尋的預設時間上限（秒），避免大班級讓 Dash 回調逾時
+PARTITION_TIME_LIMIT = 5
+
+# 搜尋每經過多少個狀態回報一次進度
+PROGRESS_INTERVAL = 4096
+
+# 平行分組的行程數（環境變數 NETVIZ_PARTITION_WORKERS），0 表示在目前行程依序計算
+PARTITION_WORKERS = int(os.environ.get('NETVIZ_PARTITION_WORKERS', '0'))
+_process_pool = None
+
+# 單一性別的分支定界分散到多少個行程搜尋（環境變數 NETVIZ_SEARCH_WORKERS），0 或 1 表示在目前行程搜尋並回報進度
+SEARCH_WORKERS = int(os.environ.get('NETVIZ_SEARCH_WORKERS', '0'))
+
+# 分組結果快取：依圖的指紋、分組大小與偏好選項記憶結果，最後一次使用後 NETVIZ_SESSION_TTL 秒過期。
+# 設定 NETVIZ_PARTITION_CACHE_DIR 時同時寫入該目錄：背景回調在各自的工作行程中分組，
+# 結果必須存到檔案，之後的工作（其他行程）才能讀回；未設定時只存在目前行程的記憶體中
+PARTITION_CACHE_MAX_ENTRIES = 128
+PARTITION_CACHE_DIR = os.environ.get('NETVIZ_PARTITION_CACHE_DIR')
+_partition_cache = SessionStore(max_entries=PARTITION_CACHE_MAX_ENTRIES, ttl=int(os.environ.get('NETVIZ_SESSION_TTL', '3600')),
+                                directory=PARTITION_CACHE_DIR or None)
+
+# 權重掃描的預設加權倍數（1 表示不加權）
+SWEEP_FACTORS = (1, 2, 3, 5, 10, 20)
+
+# 分組顏色：matplotlib 'tab10'（10 色）接 'Set3'（12 色）的 hex 值，預先列出以免執行時載入 matplotlib
+PARTITION_PALETTE = (
+    '#1f77b4', '#ff7f0e', '#2ca02c', '#d62728', '#9467bd', '#8c564b', '#e377c2', '#7f7f7f', '#bcbd22', '#17becf',
+    '#8dd3c7', '#ffffb3', '#bebada', '#fb8072', '#80b1d3', '#fdb462', '#b3de69', '#fccde5', '#d9d9d9', '#bc80bd',
+    '#ccebc5', '#ffed6f',
+)
+
+def _unique_node_ids(st_ids):
+    """確保每個節點只出現一次（保留第一次出現的順序）"""
+    _, first_index = np.unique(st_ids, return_index=True)
+    return st_ids[np.sort(first_index)].tolist()
 
 def generate_cytoscape_elements(df, node_size=2):
-    elements = []
     max_weight = 3
-    nodes = set()
-    
+    st_ids = df['st_id'].to_numpy()
+    node_ids = _unique_node_ids(st_ids)
+
+    # 每位學生的三條邊依 order1, order2, order3 的順序排列
+    sources = np.repeat(st_ids, len(ORDER_COLUMNS)).tolist()
+    targets = df[ORDER_COLUMNS].to_numpy().ravel().tolist()
+    edge_weights = np.tile(np.array(ORDER_WEIGHTS) / max_weight, len(st_ids)).tolist()
+
     # 添加節點和邊
-    for _, row in df.iterrows():
-        # st_id_color = '#81AFBB' if row['st_id'] <= 20 else '#ED859D'
-        
-        # 確保每個節點只出現一次
-        if row['st_id'] not in nodes:
-            elements.append({'data': {'id': str(row['st_id']), 'label': f'{row["st_id"]}', 
-                                      'score': node_size / 10, 'color': '#ED859D'}})
-            nodes.add(row['st_id'])
-
-        # 添加邊
-        elements.append({'data': {'source': str(row['st_id']), 'target': str(row['order1']), 'weight': 3/max_weight}, 'color': '#888'})
-        elements.append({'data': {'source': str(row['st_id']), 'target': str(row['order2']), 'weight': 2/max_weight}, 'color': '#888'})
-        elements.append({'data': {'source': str(row['st_id']), 'target': str(row['order3']), 'weight': 1/max_weight}, 'color': '#888'})
+    elements = [{'data': {'id': str(node_id), 'label': f'{node_id}', 'score': node_size / 10, 'color': '#ED859D'}}
+                for node_id in node_ids]
+    # 邊以位置編號作為 id，讓選取的邊可以透過元素索引找回
+    elements.extend({'data': {'id': f'e{i}', 'source': str(source), 'target': str(target), 'weight': weight}, 'color': '#888'}
+                    for i, (source, target, weight) in enumerate(zip(sources, targets, edge_weights)))
 
     return elements
 
-def get_default_stylesheet():
-    return [
-        {
-            'selector': 'node',
-            'style': {
-                'label': 'data(label)',
-                'width': 'mapData(score, 0, 1, 20, 60)',
-                'height': 'mapData(score, 0, 1, 20, 60)',
-                'font-size': '10px',
-                'text-valign': 'center',
-                'text-halign': 'center',
-                'background-color': 'data(color)'
-            }
-        },
-        {
-            'selector': 'node:selected',
-            'style': {
-                'border-width': '2px',
-                'border-color': '#877F6C',
-                'overlay-opacity': 0.2
-            }
-        },
-        {
-            'selector': 'edge',
-            'style': {
-                'line-color': 'data(color)',
-                'target-arrow-color': 'data(color)',
-                'target-arrow-shape': 'triangle',
-                'curve-style': 'bezier',
-                'opacity': 0.8,
-                'arrow-scale': 1.2,
-                'width': f'mapData(weight, 0, 1, 0, 5)'
-            }
-        },
-        {
-            'selector': 'edge:selected',
-            'style': {
-                'border-width': '2px',
-                'border-color': '#877F6C',
-                'background-color': '#877F6C',
-                'overlay-opacity': 0.2
-            }
-        }
-    ]
+def build_element_index(elements):
+    """
+    建立元素 id -> 在 elements 中位置的索引，重新上色時可直接找到元素，不必掃描整個列表。
+    回調之間只會修改元素的顏色與大小，不會增減或重新排序，因此同一份 elements 的索引一直有效。
+
+    參數:
+    - elements: Cytoscape 元素列表
+
+    返回:
+    - {element_id: position}
+    """
+    return {element['data']['id']: i for i, element in enumerate(elements) if 'id' in element['data']}
+
+def cytoscape_element_index(df):
+    """
+    與 build_element_index(generate_cytoscape_elements(df)) 相同的索引，直接由 DataFrame 計算，
+    讓伺服器不必取回瀏覽器中的元素列表也能以 Patch 更新指定位置的元素
+    """
+    node_ids = _unique_node_ids(df['st_id'].to_numpy())
+    element_index = {str(node_id): i for i, node_id in enumerate(node_ids)}
+    num_edges = len(df) * len(ORDER_COLUMNS)
+    element_index.update((f'e{i}', len(node_ids) + i) for i in range(num_edges))
+    return element_index
+
+def build_tap_adjacency(df):
+    """
+    點選節點時顯示的入邊與出邊（含順位），每個上傳檔案只需建立一次
+
+    參數:
+    - df: 包含 'st_id', 'order1', 'order2', 'order3' 的 DataFrame
 
-def generate_layout(layout_value, seed, node_repulsion):
-    layout = {'name': layout_value, 'randomize': True, 'seed': seed}
-    if layout_value == 'cose':
-        layout['nodeRepulsion'] = node_repulsion * 10000
-    return layout
+    返回:
+    - {node_id (str): {'in': [(source, rank), ...], 'out': [(target, rank), ...]}}，rank 為 1~3 順位
+    """
+    sources = np.repeat(df['st_id'].to_numpy(), len(ORDER_COLUMNS)).tolist()
+    targets = df[ORDER_COLUMNS].to_numpy().ravel().tolist()
+    ranks = list(range(1, len(ORDER_COLUMNS) + 1)) * len(df)
+
+    adjacency = {}
+    for source, target, rank in zip(sources, targets, ranks):
+        source, target = str(source), str(target)
+        adjacency.setdefault(source, {'in': [], 'out': []})['out'].append((target, rank))
+        adjacency.setdefault(target, {'in': [], 'out': []})['in'].append((source, rank))
+    return adjacency
 
 def create_directed_graph(df):
     """
@@ -88,25 +128,14 @@ def create_directed_graph(df):
     返回:
     - G: NetworkX 的有向圖
     """
-    # 將 order1, order2, order3 展開
-    df_order = pd.melt(df, id_vars='st_id', value_vars=['order1', 'order2', 'order3'])
-    df_order.columns = ['from', 'weight', 'to']
+    # 將 order1, order2, order3 依序展開成邊陣列（與 pd.melt 的排列相同），並根據順序給予不同的邊權重
+    sources = np.tile(df['st_id'].to_numpy(), len(ORDER_COLUMNS))
+    targets = df[ORDER_COLUMNS].to_numpy().ravel(order='F')
+    weights = np.repeat(ORDER_WEIGHTS, len(df))
 
-    # 根據順序給予不同的邊權重
-    df_order.weight = df_order.weight.map({
-        'order1': 3,
-        'order2': 2,
-        'order3': 1
-    })
-
-    df_order = df_order[['from', 'to', 'weight']]
-
-    # 建立有向圖
+    # 建立有向圖，一次加入所有邊
     G = nx.DiGraph()
-
-    # 將節點和邊添加到圖中
-    for _, row in df_order.iterrows():
-        G.add_edge(row['from'], row['to'], weight=row['weight'])
+    G.add_weighted_edges_from(zip(sources.tolist(), targets.tolist(), weights.tolist()))
 
     return G
 
@@ -181,87 +210,449 @@ def calculate_group_weights(optimized_groups, G):
 
     return intra_group_weight, inter_group_weight
 
-# 回溯優化過程
-def backtrack_optimize_groups(G, target_sizes):
-    """
-    回溯法進行優化分配，確保組內邊權重最大，組間邊權重最小。
-    """
-    # 初始化分組和狀態
-    optimized_groups = {i: [] for i in range(len(target_sizes))}
-    assigned_nodes = set()  # 已分配的節點
-    sorted_nodes = sorted(G.degree(weight='weight'), key=lambda x: x[1])  # 根據邊權重排序
-
-    # 初始化最佳結果
-    best_intra_weight = float('-inf')  # 初始化最大組內邊權重為負無窮
-    best_inter_weight = float('inf')   # 初始化最小組間邊權重為正無窮
-    best_groups = None  # 初始化最優分組方案
-
-    # 嘗試將節點分配到組內
-    def try_assign_node(node, group_id):
-        """將節點分配到組內，並根據邊的權重進行優先分配"""
-        if len(optimized_groups[group_id]) < target_sizes[group_id]:
-            # 如果組內無其他節點，直接分配
-            if not optimized_groups[group_id]:
-                optimized_groups[group_id].append(node)
-                assigned_nodes.add(node)
-                return True
-            # 否則，計算該節點與組內其他節點的連接權重總和，優先分配高權重的節點
-            total_weight = sum(G[node][member]['weight'] for member in optimized_groups[group_id] if G.has_edge(node, member) or G.has_edge(member, node))
-            if total_weight > 0:
-                optimized_groups[group_id].append(node)
-                assigned_nodes.add(node)
-                return True
-        return False
+# 計算分支定界的節點順序
+def connectivity_order(graph):
+    """
+    從加權度數最大的節點開始，每次挑選與已排序節點連接權重最大的節點（同分時比較加權度數），
+    讓緊密相連的學生在搜尋中相鄰，盡早形成組內連結以加強剪枝。
 
-    # 回溯分配節點
-    def backtrack_assign(remaining_nodes):
-        """遞歸回溯進行分配，遍歷所有可能的分配方案"""
-        nonlocal best_intra_weight, best_inter_weight, best_groups
-
-        # 將剩餘節點根據與其他節點的邊的權重排序，優先處理高權重的節點
-        remaining_nodes = sorted(remaining_nodes, key=lambda n: sum(G[n][neighbor]['weight'] for neighbor in G.neighbors(n)), reverse=True)
-
-        # 所有節點已分配，計算當前分組方案的權重
-        if not remaining_nodes:
-            intra_weight, inter_weight = calculate_group_weights(optimized_groups, G)
-            # 更新最佳結果
-            if intra_weight > best_intra_weight:
-                # print(f"optimized_groups: {optimized_groups}, {intra_weight}, {best_intra_weight}")
-                best_intra_weight = intra_weight
-                best_inter_weight = inter_weight
-                best_groups = {group_id: list(nodes) for group_id, nodes in optimized_groups.items()}
-            return True
+    參數:
+    - graph: CompactGraph
+
+    返回:
+    - 節點編號的排列
+    """
+    weighted_degree = graph.weighted_degree()
+    link_weight = np.zeros(len(graph))
+    # 連接權重為整數，加上小於 1 的度數分數只用於同分時的比較
+    score = weighted_degree / (weighted_degree.max() + 1) if len(graph) else weighted_degree
+    order = []
+    for _ in range(len(graph)):
+        node = int(np.argmax(link_weight + score))
+        order.append(node)
+        # 已排序的節點設為 -inf，不再被 argmax 選中
+        link_weight[node] = -np.inf
+        neighbor_ids, neighbor_weights = graph.neighbors(node)
+        link_weight[neighbor_ids] += neighbor_weights
+    return order
+
+# 分支定界優化過程
+def backtrack_optimize_groups(G, target_sizes, time_limit=None, progress_callback=None, prefix=None, shared_best=None, initial_groups=None):
+    """
+    分支定界法進行優化分配，確保組內邊權重最大，組間邊權重最小。
 
-        # 對於剩餘的節點，嘗試分配到不同的組
-        node = remaining_nodes[0]
-        assigned = False
+    搜尋過程中以 connection[i][g]（節點 i 與第 g 組已分配節點的邊權重和）
+    以及組內/組間邊權重的累計值追蹤狀態，分配或撤銷一個節點只需 O(度數) 的更新，
+    葉節點不必再重新計算整張圖的權重。剪枝用的上界同樣隨分配/撤銷增量更新。
 
-        for group_id in optimized_groups:
-            if try_assign_node(node, group_id):
-                # 遞歸嘗試下一個節點的分配
-                if backtrack_assign(remaining_nodes[1:]):
-                    assigned = True
-                # 撤銷分配，回溯
-                optimized_groups[group_id].remove(node)
-                assigned_nodes.remove(node)
+    參數:
+    - G: CompactGraph，或邊帶有 'weight' 屬性的無向圖 (networkx.Graph)
+    - target_sizes: 每組的目標人數列表
+    - time_limit: 搜尋時間上限（秒），None 表示搜尋至證明最優；逾時則回傳時間內找到的最佳分組，
+      不保證最優（26 人以上的班級通常無法在數十秒內證明最優）
+    - progress_callback: 可選的進度回報函數 progress_callback(explored, best_intra_weight)，
+      每搜尋 PROGRESS_INTERVAL 個狀態呼叫一次
+    - prefix: 可選的固定前綴，依搜尋順序指定前 len(prefix) 個節點的組別，只搜尋該子樹
+    - shared_best: 可選的 multiprocessing.Value，多個行程共用目前最佳的組內邊權重以加強剪枝；
+      若子樹中沒有比它更好的解，best_groups 為 None
+    - initial_groups: 可選的初始分組（例如上一次求解的結果），以其組內邊權重作為初始下界，
+      只搜尋嚴格更好的分組；找不到時原樣返回 initial_groups
 
-        return assigned
+    返回:
+    - best_groups: 分組方案 {group_id: [node1, node2, ...]}（搜尋完成時為最優，逾時則為時間內找到的最佳分組）
+    - best_intra_weight: 組內邊權重總和
+    - best_inter_weight: 組間邊權重總和
+    """
+    graph = G if isinstance(G, CompactGraph) else build_compact_graph(G)
+    num_groups = len(target_sizes)
+    group_sizes = [0] * num_groups
+
+    # 節點順序只計算一次，之後以順序位置作為節點編號
+    order = connectivity_order(graph)
+    num_nodes = len(order)
+    position = [0] * num_nodes
+    for i, node in enumerate(order):
+        position[node] = i
+
+    # 鄰接串列（依權重由大到小），取自 CompactGraph 的 CSR 陣列
+    adjacency_lists = graph.adjacency_lists()
+    neighbors = []
+    for node in order:
+        adjacency = [(position[neighbor], weight) for neighbor, weight in adjacency_lists[node]]
+        adjacency.sort(key=lambda x: x[1], reverse=True)
+        neighbors.append(adjacency)
+
+    connection = [[0] * num_groups for _ in range(num_nodes)]
+    assignment = [-1] * num_nodes
+
+    # 初始化最佳結果；incumbent 為剪枝用的門檻（自己或其他行程找到的最佳組內權重）
+    best_intra_weight = float('-inf')
+    best_inter_weight = float('inf')
+    best_assignment = None
+    incumbent = float('-inf') if shared_best is None else shared_best.value
+    if initial_groups is not None:
+        initial_assignment = [0] * num_nodes
+        for group_id, members in initial_groups.items():
+            for node in members:
+                initial_assignment[graph.index[node]] = group_id
+        initial_intra_weight, initial_inter_weight = graph.group_weights(initial_assignment)
+        incumbent = max(incumbent, initial_intra_weight - graph.self_loop_weight)
+    deadline = None if time_limit is None else time.monotonic() + time_limit
+    explored = 0
+    timed_out = False
+
+    # 剪枝用的上界：未分配節點 i 的貢獻 node_bound[i] = max(connected_bound[i], unconnected_bound[i])，其中
+    # connected_bound[i] 為 i 已有鄰居、且尚有空位的組 g 中 2 * connection[i][g] + pending_prefix[i][剩餘空位 - 1] 的最大值
+    # （connected_group[i] 為取得最大值的組），unconnected_bound[i] = pending_prefix[i][max_open - 1] 涵蓋其餘的組
+    # （max_open 為各組剩餘空位的最大值），pending_prefix[i][p] 為 i 與未分配鄰居最大的 p 條邊權重和；
+    # bound_total 為所有未分配節點的總和。分配一個節點到第 g 組時只需重新計算它的鄰居，
+    # 以及 connected_group 為第 g 組的節點（max_open 改變時才更新所有未分配節點），撤銷時依 trail 還原。
+    max_partners = max(target_sizes, default=1) - 1
+    pending_prefix = [None] * num_nodes
+    connected_bound = [0] * num_nodes
+    connected_group = [-1] * num_nodes
+    unconnected_bound = [0] * num_nodes
+    node_bound = [0] * num_nodes
+    bound_total = 0
+    group_members = [[] for _ in range(num_groups)]
+    # open_slot_counts[r]：剩餘空位為 r 的組數
+    open_slot_counts = [0] * (max_partners + 2)
+    for size in target_sizes:
+        if size > 0:
+            open_slot_counts[size] += 1
+    max_open = max((size for size in target_sizes if size > 0), default=0)
+
+    def node_pending_prefix(i):
+        """節點 i 與未分配鄰居的邊權重中，最大的 0..max_partners 條的累計和"""
+        prefix = [0] * (max_partners + 1)
+        count = 0
+        for j, weight in neighbors[i]:
+            if count == max_partners:
+                break
+            if assignment[j] == -1:
+                count += 1
+                prefix[count] = prefix[count - 1] + weight
+        for p in range(count + 1, max_partners + 1):
+            prefix[p] = prefix[count]
+        return prefix
+
+    def node_connected_bound(i):
+        """i 已有鄰居、且尚有空位的組中，2 * connection[i][g] + pending_prefix[i][剩餘空位 - 1] 的最大值及該組"""
+        node_connection, prefix = connection[i], pending_prefix[i]
+        best, best_group = 0, -1
+        for j, _ in neighbors[i]:
+            group_id = assignment[j]
+            if group_id != -1:
+                remaining = target_sizes[group_id] - group_sizes[group_id]
+                if remaining > 0:
+                    value = 2 * node_connection[group_id] + prefix[remaining - 1]
+                    if value > best:
+                        best, best_group = value, group_id
+        return best, best_group
+
+    def assign(index, group_id, trail):
+        """
+        分配第 index 個節點並更新上界。trail[0] 為舊的 max_open，
+        其後為被修改節點的 (節點, 舊 connected_bound, 舊 connected_group, 舊 unconnected_bound, 舊 pending_prefix)，供撤銷
+        """
+        nonlocal bound_total, max_open
+        trail.append(max_open)
+        remaining = target_sizes[group_id] - group_sizes[group_id]
+        open_slot_counts[remaining] -= 1
+        if remaining > 1:
+            open_slot_counts[remaining - 1] += 1
+        while max_open > 0 and open_slot_counts[max_open] == 0:
+            max_open -= 1
+        assignment[index] = group_id
+        group_sizes[group_id] += 1
+        group_members[group_id].append(index)
+        bound_total -= node_bound[index]
+        old_prefixes = {}
+        for j, weight in neighbors[index]:
+            connection[j][group_id] += weight
+            if j > index:
+                old_prefixes[j] = pending_prefix[j]
+                pending_prefix[j] = node_pending_prefix(j)
+
+        if max_open != trail[0]:
+            # 最大剩餘空位改變：所有未分配節點（依搜尋順序即 index 之後的節點）的 unconnected_bound 都要更新
+            affected = range(index + 1, num_nodes)
+        else:
+            # 只有 index 的鄰居（connection 與 pending_prefix 已改變），以及最佳的相連組別為第 g 組
+            # （該組空位減少）的節點受影響；後者必定與第 g 組的成員相鄰
+            affected = set(old_prefixes)
+            for member in group_members[group_id]:
+                for j, _ in neighbors[member]:
+                    if j > index and connected_group[j] == group_id:
+                        affected.add(j)
+        for i in affected:
+            trail.append((i, connected_bound[i], connected_group[i], unconnected_bound[i], old_prefixes.get(i, pending_prefix[i])))
+            connected, connected_group[i] = node_connected_bound(i)
+            unconnected = pending_prefix[i][max_open - 1] if max_open > 0 else 0
+            bound = connected if connected > unconnected else unconnected
+            bound_total += bound - node_bound[i]
+            connected_bound[i], unconnected_bound[i], node_bound[i] = connected, unconnected, bound
+
+    def unassign(index, group_id, trail):
+        """撤銷 assign，依相反順序還原 trail"""
+        nonlocal bound_total, max_open
+        for i, connected, group, unconnected, prefix in reversed(trail[1:]):
+            bound = connected if connected > unconnected else unconnected
+            bound_total += bound - node_bound[i]
+            connected_bound[i], connected_group[i], unconnected_bound[i], node_bound[i], pending_prefix[i] = \
+                connected, group, unconnected, bound, prefix
+        for j, weight in neighbors[index]:
+            connection[j][group_id] -= weight
+        bound_total += node_bound[index]
+        group_members[group_id].pop()
+        group_sizes[group_id] -= 1
+        assignment[index] = -1
+        remaining = target_sizes[group_id] - group_sizes[group_id]
+        open_slot_counts[remaining] += 1
+        if remaining > 1:
+            open_slot_counts[remaining - 1] -= 1
+        max_open = trail[0]
+
+    def candidate_groups(index):
+        """列出節點可分配的組別及分配後增加的組內邊權重，增益大的組別優先"""
+        tried_empty_sizes = set()
+        candidates = []
+        node_connection = connection[index]
+        for group_id in range(num_groups):
+            if group_sizes[group_id] >= target_sizes[group_id]:
+                continue
+            if group_sizes[group_id] == 0:
+                # 對稱性破除：目標人數相同的空組別彼此等價，只需嘗試其中一組
+                if target_sizes[group_id] in tried_empty_sizes:
+                    continue
+                tried_empty_sizes.add(target_sizes[group_id])
+            candidates.append((node_connection[group_id], group_id))
+        candidates.sort(key=lambda x: x[0], reverse=True)
+        return candidates
+
+    def backtrack_assign(index, intra_weight, inter_weight):
+        """依固定順序分配第 index 個節點，上界無法超越目前最佳解時剪枝"""
+        nonlocal best_intra_weight, best_inter_weight, best_assignment, incumbent, explored, timed_out
+
+        explored += 1
+        # 大型名單每個狀態的成本較高，每個狀態都檢查時間上限，避免超過 Dash 回調的等待時間
+        if deadline is not None and time.monotonic() > deadline:
+            timed_out = True
+        if shared_best is not None and explored % 256 == 0:
+            incumbent = max(incumbent, shared_best.value)
+        if progress_callback is not None and explored % PROGRESS_INTERVAL == 0:
+            progress_callback(explored, best_intra_weight)
+        if timed_out:
+            return
+
+        # 所有節點已分配，更新最佳結果
+        if index == num_nodes:
+            if intra_weight > incumbent:
+                best_intra_weight = incumbent = intra_weight
+                best_inter_weight = inter_weight
+                best_assignment = list(assignment)
+                if shared_best is not None:
+                    with shared_best.get_lock():
+                        shared_best.value = max(shared_best.value, intra_weight)
+            return
+
+        # 剪枝：即使剩餘節點全部以最佳情況分配（上界乘以 2 以避免小數），也無法超越目前最佳解
+        if 2 * intra_weight + bound_total <= 2 * incumbent:
+            return
+
+        assigned_weight = sum(connection[index])
+        for gain, group_id in candidate_groups(index):
+            trail = []
+            assign(index, group_id, trail)
+            backtrack_assign(index + 1, intra_weight + gain, inter_weight + assigned_weight - gain)
+            # 撤銷分配，回溯
+            unassign(index, group_id, trail)
+
+    # 所有節點都未分配時的上界貢獻
+    for i in range(num_nodes):
+        pending_prefix[i] = node_pending_prefix(i)
+        unconnected_bound[i] = node_bound[i] = pending_prefix[i][max_open - 1] if max_open > 0 else 0
+        bound_total += node_bound[i]
+
+    # 套用固定前綴的分配，從子樹的根開始搜尋
+    intra_weight, inter_weight = 0, 0
+    for index, group_id in enumerate(prefix or []):
+        gain = connection[index][group_id]
+        intra_weight += gain
+        inter_weight += sum(connection[index]) - gain
+        assign(index, group_id, [])
+
+    # 遞迴深度等於節點數，大型名單超過預設的遞迴上限時提高上限（只提高、不降低，以免影響其他執行緒）
+    if sys.getrecursionlimit() < num_nodes + 100:
+        sys.setrecursionlimit(num_nodes + 100)
+    backtrack_assign(len(prefix or []), intra_weight, inter_weight)
+
+    if best_assignment is None:
+        if initial_groups is not None:
+            return {group_id: list(members) for group_id, members in initial_groups.items()}, \
+                initial_intra_weight, initial_inter_weight
+        return None, float('-inf'), float('inf')
+
+    best_groups = {group_id: [] for group_id in range(num_groups)}
+    for i, group_id in enumerate(best_assignment):
+        best_groups[group_id].append(graph.nodes[order[i]])
+    return best_groups, best_intra_weight + graph.self_loop_weight, best_inter_weight
+
+def enumerate_prefixes(target_sizes, depth):
+    """
+    列出搜尋樹前 depth 層的所有分配前綴（已套用容量限制與相同人數空組的對稱性破除），
+    順序與 backtrack_optimize_groups 分支的組別順序無關，但涵蓋所有子樹。
+    """
+    prefixes = []
+    group_sizes = [0] * len(target_sizes)
+    prefix = []
+
+    def expand():
+        if len(prefix) == depth:
+            prefixes.append(list(prefix))
+            return
+        tried_empty_sizes = set()
+        for group_id, target_size in enumerate(target_sizes):
+            if group_sizes[group_id] >= target_size:
+                continue
+            if group_sizes[group_id] == 0:
+                if target_size in tried_empty_sizes:
+                    continue
+                tried_empty_sizes.add(target_size)
+            prefix.append(group_id)
+            group_sizes[group_id] += 1
+            expand()
+            group_sizes[group_id] -= 1
+            prefix.pop()
+
+    expand()
+    return prefixes
+
+# 子樹搜尋行程共用的最佳組內邊權重（由行程池的 initializer 設定）
+_shared_best = None
+
+def _init_shared_best(shared_best):
+    global _shared_best
+    _shared_best = shared_best
+
+def _solve_subtree(graph, target_sizes, prefix, deadline, initial_groups=None):
+    """在工作行程中搜尋單一前綴的子樹，deadline 為 time.time() 的絕對時間或 None"""
+    time_limit = None if deadline is None else max(0.0, deadline - time.time())
+    return backtrack_optimize_groups(graph, target_sizes, time_limit, prefix=prefix, shared_best=_shared_best,
+                                     initial_groups=initial_groups)
+
+def parallel_backtrack_optimize_groups(G, target_sizes, time_limit=None, max_workers=None, split_factor=4, initial_groups=None):
+    """
+    將分支定界的搜尋樹從根部展開前幾層，各子樹交給 ProcessPoolExecutor 的工作行程搜尋。
+    所有行程透過 multiprocessing.Value 共用目前最佳的組內邊權重，任何行程找到更好的解都會讓其他行程剪枝更多。
+    組內權重相同的最佳解可能因行程執行先後而不同。
+
+    參數:
+    - G: CompactGraph，或邊帶有 'weight' 屬性的無向圖
+    - target_sizes: 每組的目標人數列表
+    - time_limit: 整體搜尋時間上限（秒），None 表示搜尋至證明最優
+    - max_workers: 工作行程數，預設為 CPU 核心數
+    - split_factor: 子樹數量至少為工作行程數的幾倍，讓負載較平均
+    - initial_groups: 可選的初始分組，與 backtrack_optimize_groups 相同；沒有更好的分組時原樣返回
+
+    返回:
+    - best_groups, best_intra_weight, best_inter_weight（與 backtrack_optimize_groups 相同）
+    """
+    graph = G if isinstance(G, CompactGraph) else build_compact_graph(G)
+    max_workers = max_workers or os.cpu_count() or 1
+    deadline = None if time_limit is None else time.time() + time_limit
+
+    # 展開到子樹數量足夠分配給所有工作行程為止
+    depth = 0
+    prefixes = [[]]
+    while depth < len(graph) - 1 and len(prefixes) < max_workers * split_factor:
+        depth += 1
+        prefixes = enumerate_prefixes(target_sizes, depth)
+
+    shared_best = multiprocessing.Value('d', float('-inf'))
+    with ProcessPoolExecutor(max_workers=max_workers, initializer=_init_shared_best, initargs=(shared_best,)) as pool:
+        futures = [pool.submit(_solve_subtree, graph, target_sizes, prefix, deadline, initial_groups) for prefix in prefixes]
+        results = [future.result() for future in futures]
+
+    # 取組內邊權重最大的子樹結果（同分時取前綴順序較前者）
+    best_result = (None, float('-inf'), float('inf'))
+    for result in results:
+        if result[0] is not None and result[1] > best_result[1]:
+            best_result = result
+    return best_result
+
+def optimize_graph_partition(directed_G, target_sizes, time_limit=PARTITION_TIME_LIMIT, progress_callback=None, workers=None, method='exact', solver='cpsat', seed=46,
+                             stats=None):
+    """
+    主函數，接受有向圖和分組大小，返回最優分組結果
 
-    # 找出尚未分配的節點並進行回溯分配
-    remaining_nodes = [n for n, weighted_degree in sorted_nodes if n not in assigned_nodes]
-    backtrack_assign(remaining_nodes)
+    參數:
+    - directed_G: 學生偏好的有向圖
+    - target_sizes: 每組的目標人數列表
+    - time_limit: 搜尋時間上限（秒），None 表示搜尋至證明最優；有上限時結果為時間內找到的最佳分組，不保證最優
+    - progress_callback: 可選的進度回報函數 progress_callback(explored, best_intra_weight)
+    - workers: 大於 1 時以 parallel_backtrack_optimize_groups 分散到多個行程搜尋（不回報進度）
+    - method: 'exact' 先以 'heuristic' 與 'anneal' 的較佳結果作為初始解，再以分支定界搜尋更好的分組；'heuristic' 使用貪婪初始分組加交換改善，適合數百人以上的名單；
+      'ilp' 以整數規劃求解器證明最優（需安裝選用套件）；
+      'anneal' 以模擬退火在時間上限內搜尋
+    - solver: method='ilp' 時使用的求解器，'cpsat'（OR-Tools）或 'cbc'（PuLP）
+    - seed: method='anneal'（以及 'exact' 的初始解）使用的亂數種子
+    - stats: 可選的 dict；method='ilp' 時寫入 stats['gap']（相對最優性差距，0 表示已證明最優，
+      無法取得時為 None，見 ilp_optimize_groups）
 
-    return best_groups, best_intra_weight, best_inter_weight
+    返回:
+    - best_groups, best_intra_weight, best_inter_weight
 
-def optimize_graph_partition(directed_G, target_sizes):
-    """主函數，接受有向圖和分組大小，返回最優分組結果"""
-    # 將有向圖轉換為無向圖
+    圖中的學生多於組別人數總和時拋出 ValueError
+    """
+    # 將有向圖轉換為無向圖，再轉為陣列形式供搜尋使用
     undirected_G = convert_directed_to_undirected(directed_G)
+    compact_G = build_compact_graph(undirected_G)
+
+    # 圖中的節點（包含被選為順位、但不在名單中的座號）多於組別人數總和時不可能分組
+    if len(compact_G) > sum(target_sizes):
+        raise ValueError(f"Group sizes sum to {sum(target_sizes)}, but the graph has {len(compact_G)} students "
+                         f"(preferences may point to IDs that are not in the roster)")
 
-    # 開始回溯優化分配
-    best_groups, best_intra_weight, best_inter_weight = backtrack_optimize_groups(undirected_G, target_sizes)
+    return _optimize_compact_partition(compact_G, target_sizes, time_limit, progress_callback, workers, method, solver, seed,
+                                       stats=stats)
 
-    return best_groups, best_intra_weight, best_inter_weight
+def _optimize_compact_partition(compact_G, target_sizes, time_limit, progress_callback=None, workers=None, method='exact',
+                                solver='cpsat', seed=46, initial_groups=None, stats=None):
+    """
+    依 method 在 CompactGraph 上求解分組，參數與返回值同 optimize_graph_partition。
+    initial_groups 只用於 'exact'：例如上一次（權重不同時）的分組，與啟發式結果在目前的權重下比較，較佳者作為分支定界的初始解。
+    """
+    if method == 'heuristic':
+        return heuristic_optimize_groups(compact_G, target_sizes, time_limit)
+    if method == 'anneal':
+        return anneal_optimize_groups(compact_G, target_sizes, time_limit, seed)
+    if method == 'ilp':
+        return ilp_optimize_groups(compact_G, target_sizes, solver, time_limit, stats)
+    if method != 'exact':
+        raise ValueError(f"Unknown partition method: {method}")
+
+    # 以便宜的啟發式結果作為初始解：分支定界一開始就有好的下界可剪枝，
+    # 時間上限內沒有找到更好的分組時也至少返回這個結果
+    start = time.monotonic()
+    warm_start_limit = None if time_limit is None else time_limit * WARM_START_FRACTION
+    candidates = []
+    if initial_groups is not None:
+        # 放在最前面：權重相同時保留呼叫端的分組
+        assignment = [0] * len(compact_G)
+        for group_id, members in initial_groups.items():
+            for node in members:
+                assignment[compact_G.index[node]] = group_id
+        candidates.append((initial_groups, compact_G.group_weights(assignment)[0]))
+    candidates.append(heuristic_optimize_groups(compact_G, target_sizes, warm_start_limit))
+    candidates.append(anneal_optimize_groups(compact_G, target_sizes, warm_start_limit, seed))
+    initial_groups = max(candidates, key=lambda result: result[1])[0]
+    remaining = None if time_limit is None else max(0.0, time_limit - (time.monotonic() - start))
+
+    # 開始分支定界優化分配
+    if workers is not None and workers > 1:
+        return parallel_backtrack_optimize_groups(compact_G, target_sizes, remaining, workers, initial_groups=initial_groups)
+    return backtrack_optimize_groups(compact_G, target_sizes, remaining, progress_callback, initial_groups=initial_groups)
 
 def weight_outgoing_edges_for_isolated_nodes(directed_G, weight=2):
     """
@@ -286,6 +677,23 @@ def weight_outgoing_edges_for_isolated_nodes(directed_G, weight=2):
 
     return updated_G
 
+def min_in_degree_nodes(directed_G):
+    """返回所有入度最小的節點；所有節點入度相同時返回空列表"""
+    in_degrees = dict(directed_G.in_degree())
+    if len(set(in_degrees.values())) <= 1:
+        return []
+    min_in_degree = min(in_degrees.values())
+    return [node for node, in_degree in in_degrees.items() if in_degree == min_in_degree]
+
+def smallest_group_nodes(optimal_groups):
+    """返回人數最少組別的所有節點；所有組別人數相同時返回空列表"""
+    group_sizes = {group_id: len(nodes) for group_id, nodes in optimal_groups.items()}
+    min_group_size = min(group_sizes.values())
+    smallest_groups = [group_id for group_id, size in group_sizes.items() if size == min_group_size]
+    if len(smallest_groups) == len(optimal_groups):
+        return []
+    return [node for group_id in smallest_groups for node in optimal_groups[group_id]]
+
 def weight_outgoing_edges_for_min_in_degree_nodes(directed_G, weight=2):
     """
     對於有向圖中那些入度最小的節點，將其指向其他節點的邊的權重乘以 weight。
@@ -298,21 +706,8 @@ def weight_outgoing_edges_for_min_in_degree_nodes(directed_G, weight=2):
     # 複製原有的圖，以免修改原圖
     updated_G = directed_G.copy()
 
-    # 計算每個節點的入度
-    in_degrees = dict(directed_G.in_degree())
-    
-    # 找到最小入度值
-    min_in_degree = min(in_degrees.values())
-    
-    # 找到所有具有最小入度的節點
-    min_in_degree_nodes = [node for node, in_degree in in_degrees.items() if in_degree == min_in_degree]
-
-    # 如果所有節點的入度相同，返回空列表
-    if len(set(in_degrees.values())) == 1:
-        return updated_G
-
-    # 對於每個入度最小的節點，將其指向的邊的權重加倍
-    for node in min_in_degree_nodes:
+    # 對於每個入度最小的節點，將其指向的邊的權重加倍（所有節點入度相同時不處理）
+    for node in min_in_degree_nodes(directed_G):
         for neighbor in directed_G.successors(node):  # 找到該節點指向的節點
             current_weight = directed_G[node][neighbor]['weight']
             # 將邊的權重加倍
@@ -334,166 +729,431 @@ def weight_edges_for_smallest_group(directed_G, optimal_groups, weight=2):
     # 複製原有的圖，以免修改原圖
     updated_G = directed_G.copy()
 
-    # 計算每個組別的節點數量
-    group_sizes = {group_id: len(nodes) for group_id, nodes in optimal_groups.items()}
-    
-    # 找到人數最少的組的大小
-    min_group_size = min(group_sizes.values())
-
-    # 檢查是否有超過一個組別人數最少，且不是所有組別人數相同
-    smallest_groups = [group_id for group_id, size in group_sizes.items() if size == min_group_size]
-
     # 如果所有組別人數相同，則不做處理
-    if len(smallest_groups) == len(optimal_groups):
+    nodes = smallest_group_nodes(optimal_groups)
+    if not nodes:
         print("所有組別人數相同，不進行處理。")
         return updated_G
 
     # 處理最少人數的組別，將其指向其他組別的邊權重加倍
-    for group_id in smallest_groups:
-        for node in optimal_groups[group_id]:
-            for neighbor in directed_G.successors(node):
-                # 確保 neighbor 不在同一組內 (remove)
-                # if neighbor not in optimal_groups[group_id]: (remove)
-                current_weight = directed_G[node][neighbor]['weight']
-                # 將指向其他組的邊的權重加倍
-                updated_G[node][neighbor]['weight'] = current_weight * weight
-                # print(f"節點 {node} 指向節點 {neighbor} 的邊權重已加倍，新的權重為 {updated_G[node][neighbor]['weight']}")
+    for node in nodes:
+        for neighbor in directed_G.successors(node):
+            # 確保 neighbor 不在同一組內 (remove)
+            # if neighbor not in optimal_groups[group_id]: (remove)
+            current_weight = directed_G[node][neighbor]['weight']
+            # 將指向其他組的邊的權重加倍
+            updated_G[node][neighbor]['weight'] = current_weight * weight
+            # print(f"節點 {node} 指向節點 {neighbor} 的邊權重已加倍，新的權重為 {updated_G[node][neighbor]['weight']}")
 
     return updated_G
 
-def generate_partition_colors(num_groups):
+def reweighted_edges(directed_G, original_groups, preference_option):
     """
-    根據 num_groups 的數量，從 'tab10' 和 'Set3' 組合後的 colormap 中生成顏色。
+    option2/option3 要加權的有向邊：option2 為人數最少組別的節點指向其他節點的邊，
+    option3 為入度最小的節點指向其他節點的邊。沒有需要加權的節點時返回空列表。
 
-    :param num_groups: 所需顏色的數量
-    :return: 生成的顏色列表（hex 格式）
+    返回:
+    - [(u, v, weight), ...]，weight 為原始權重
     """
-    # 獲取 'tab10' 和 'Set3' 調色盤
-    cmap1 = cm.get_cmap('tab10')
-    cmap2 = cm.get_cmap('Set3')
+    if preference_option == 'option2':
+        nodes = smallest_group_nodes(original_groups)
+    elif preference_option == 'option3':
+        nodes = min_in_degree_nodes(directed_G)
+    else:
+        nodes = []
+    return [(node, neighbor, directed_G[node][neighbor]['weight'])
+            for node in nodes for neighbor in directed_G.successors(node)]
+
+def partition_with_weight_adjustment(G, target_sizes, original_groups, preference_option, progress_callback=None, max_iteration=10, step=5,
+                                     method='exact', time_limit=PARTITION_TIME_LIMIT, workers=None):
+    """
+    遞增邊的權重（weight = step, 2*step, ...），直到分組結果與原始結果有差異，或者達到上限。
+    所有迭代共用同一張 CompactGraph，每次只就地增加受影響邊的權重；
+    method='exact' 時上一次的分組與啟發式結果在新權重下比較，較佳者作為分支定界的初始下界。
 
-    # 提取這兩個調色盤的顏色
-    num_colors_cmap1 = cmap1.N
-    num_colors_cmap2 = cmap2.N
+    參數:
+    - G: 有向圖
+    - target_sizes: 目標分組大小
+    - original_groups: 原始的分組結果
+    - preference_option: 'option2' 或 'option3'
+    - progress_callback: 可選的進度回報函數，傳給每次重新分組的搜尋
+    - max_iteration: 最多加權次數
+    - step: 每次增加的權重倍數
+    - method: 每次重新分組的搜尋方法（同 optimize_graph_partition）
+    - time_limit: 每次重新分組的時間上限（秒）
+    - workers: 同 optimize_graph_partition
 
-    # 將兩個 colormap 的顏色組合
-    colors_cmap1 = [mcolors.to_hex(cmap1(i / num_colors_cmap1)) for i in range(num_colors_cmap1)]
-    colors_cmap2 = [mcolors.to_hex(cmap2(i / num_colors_cmap2)) for i in range(num_colors_cmap2)]
+    返回:
+    - best_groups: 最優分組結果
+    """
+    edges = reweighted_edges(G, original_groups, preference_option)
+    # 權重全為 0 時加權後的圖與原圖相同，不需重新分組
+    if not any(weight for _, _, weight in edges):
+        return original_groups
+
+    compact_G = build_compact_graph(convert_directed_to_undirected(G))
+    sources = np.array([compact_G.index[u] for u, _, _ in edges])
+    targets = np.array([compact_G.index[v] for _, v, _ in edges])
+    weights = np.array([weight for _, _, weight in edges])
+
+    best_groups = original_groups
+    previous_weight, weight = 1, step
+    for _ in range(max_iteration):
+        # 邊權重從 原始權重 * previous_weight 提高到 原始權重 * weight
+        compact_G.add_weights(sources, targets, weights * (weight - previous_weight))
+        best_groups = _optimize_compact_partition(compact_G, target_sizes, time_limit, progress_callback, workers, method,
+                                                  initial_groups=best_groups)[0]
+        if best_groups != original_groups:
+            return best_groups
+        previous_weight, weight = weight, weight + step
+
+    return original_groups
+
+def boosted_nodes(directed_G, rule):
+    """
+    權重掃描要加權的節點：'isolated' 為沒有被任何人選擇（入度為 0）的節點，
+    'min_in_degree' 為入度最小的節點（所有節點入度相同時為空列表）
+    """
+    if rule == 'isolated':
+        return [node for node, in_degree in directed_G.in_degree() if in_degree == 0]
+    if rule == 'min_in_degree':
+        return min_in_degree_nodes(directed_G)
+    raise ValueError(f"Unknown sweep rule: {rule}")
+
+def count_satisfied(directed_G, groups, nodes):
+    """計算 nodes 中至少與一位自己選擇的同學同組的人數"""
+    group_of = {node: group_id for group_id, members in groups.items() for node in members}
+    return sum(1 for node in nodes
+               if any(group_of.get(neighbor) == group_of.get(node) for neighbor in directed_G.successors(node)))
+
+def sweep_preference_weights(directed_G, target_sizes, factors=SWEEP_FACTORS, rule='isolated', time_limit=PARTITION_TIME_LIMIT,
+                             method='exact'):
+    """
+    一次求出多個加權倍數下的分組，並返回互不相同的分組及其 Pareto 標記。
+    加權方式與 weight_outgoing_edges_for_isolated_nodes / weight_outgoing_edges_for_min_in_degree_nodes 相同：
+    將加權節點指向其他節點的邊權重乘以倍數。
 
-    # 合併顏色列表
-    combined_colors = colors_cmap1 + colors_cmap2
+    倍數由小到大處理，所有倍數共用同一張 CompactGraph，只就地增加受影響邊的權重。
+    第一個倍數與 optimize_graph_partition 相同，以啟發式結果作為初始解；之後的倍數以上一個倍數的分組作為初始解。
+    所有倍數共用 time_limit：每個倍數平均分配剩下的時間，提早結束的倍數把時間留給後面的倍數。
 
-    # 如果 num_groups 大於合併後顏色數量，則循環使用這些顏色
-    final_colors = [combined_colors[i % len(combined_colors)] for i in range(num_groups)]
+    參數:
+    - directed_G: 學生偏好的有向圖
+    - target_sizes: 每組的目標人數列表
+    - factors: 要掃描的加權倍數
+    - rule: 'isolated' 或 'min_in_degree'，見 boosted_nodes
+    - time_limit: 所有倍數合計的搜尋時間上限（秒），None 表示每個倍數都搜尋至證明最優
+    - method: 每個倍數使用的搜尋方法，見 optimize_graph_partition
+
+    返回:
+    - results: 依最小倍數排序的列表，每個元素為
+      {'factors': 得到此分組的倍數列表, 'groups': 分組方案,
+       'intra_weight': 原始權重下的組內邊權重, 'inter_weight': 原始權重下的組間邊權重,
+       'satisfied': 至少與一位自己選擇的同學同組的加權學生人數, 'boosted': 加權學生人數,
+       'pareto': 是否在組內權重與 satisfied 兩個目標上都不被其他分組支配}
+    """
+    undirected_G = convert_directed_to_undirected(directed_G)
+    original_G = build_compact_graph(undirected_G)
+    compact_G = build_compact_graph(undirected_G)
+
+    nodes = boosted_nodes(directed_G, rule)
+    edges = [(node, neighbor, directed_G[node][neighbor]['weight'])
+             for node in nodes for neighbor in directed_G.successors(node)]
+    sources = np.array([compact_G.index[u] for u, _, _ in edges], dtype=np.int64)
+    targets = np.array([compact_G.index[v] for _, v, _ in edges], dtype=np.int64)
+    weights = np.array([weight for _, _, weight in edges])
+
+    results = {}
+    best_groups = None
+    previous_factor = 1
+    factors = sorted(set(factors))
+    deadline = None if time_limit is None else time.monotonic() + time_limit
+    for position, factor in enumerate(factors):
+        if len(edges) and factor != previous_factor:
+            compact_G.add_weights(sources, targets, weights * (factor - previous_factor))
+            previous_factor = factor
+        factor_limit = None if deadline is None else max(0.0, deadline - time.monotonic()) / (len(factors) - position)
+        best_groups, _, _ = _optimize_compact_partition(compact_G, target_sizes, factor_limit, method=method,
+                                                        initial_groups=best_groups)
+
+        # 以成員集合辨識相同的分組（組別編號與組內順序不影響）
+        key = frozenset(frozenset(members) for members in best_groups.values())
+        if key in results:
+            results[key]['factors'].append(factor)
+            continue
+        assignment = [0] * len(original_G)
+        for group_id, members in best_groups.items():
+            for node in members:
+                assignment[original_G.index[node]] = group_id
+        intra_weight, inter_weight = original_G.group_weights(assignment)
+        results[key] = {
+            'factors': [factor],
+            'groups': _copy_groups(best_groups),
+            'intra_weight': intra_weight,
+            'inter_weight': inter_weight,
+            'satisfied': count_satisfied(directed_G, best_groups, nodes),
+            'boosted': len(nodes),
+        }
 
-    return final_colors
+    results = list(results.values())
+    for result in results:
+        result['pareto'] = not any(
+            other['intra_weight'] >= result['intra_weight'] and other['satisfied'] >= result['satisfied']
+            and (other['intra_weight'] > result['intra_weight'] or other['satisfied'] > result['satisfied'])
+            for other in results)
+    return results
+
+def graph_fingerprint(G):
+    """以排序後的節點與邊（含權重）計算圖的雜湊值，作為分組快取的鍵"""
+    hasher = hashlib.sha256()
+    hasher.update(repr(sorted(G.nodes())).encode())
+    hasher.update(repr(sorted(G.edges(data='weight'))).encode())
+    return hasher.hexdigest()
+
+def _copy_groups(groups):
+    """複製分組結果，避免呼叫端修改到快取內容"""
+    if groups is None:
+        return None
+    return {group_id: list(nodes) for group_id, nodes in groups.items()}
+
+def cached_optimize_graph_partition(directed_G, target_sizes, fingerprint=None, progress_callback=None):
+    """與 optimize_graph_partition 相同，但依圖的指紋與分組大小快取結果"""
+    if fingerprint is None:
+        fingerprint = graph_fingerprint(directed_G)
+    key = ('partition', fingerprint, tuple(target_sizes))
+    result = _partition_cache.get(key)
+    if result is None:
+        result = optimize_graph_partition(directed_G, target_sizes, progress_callback=progress_callback, workers=SEARCH_WORKERS)
+        _partition_cache.put(key, result)
+    best_groups, best_intra_weight, best_inter_weight = result
+    return _copy_groups(best_groups), best_intra_weight, best_inter_weight
+
+def partition_groups(directed_G, target_sizes, preference_option, progress_callback=None):
+    """
+    依偏好選項求出一個性別的分組結果，相同的圖、分組大小與偏好選項只計算一次
+
+    參數:
+    - directed_G: 該性別的有向圖
+    - target_sizes: 目標分組大小列表
+    - preference_option: 'option1', 'option2' 或 'option3'
+    - progress_callback: 可選的進度回報函數 progress_callback(explored, best_intra_weight)
 
-def apply_partition_and_color(df, male_range, female_range, elements, male_target_sizes, female_target_sizes, preference_option, update_target="both"):
+    返回:
+    - best_groups: {group_id: [node1, node2, ...]}
     """
-    根據分組結果給 elements 中的節點進行分組顏色標記
-    
+    fingerprint = graph_fingerprint(directed_G)
+    key = ('groups', fingerprint, tuple(target_sizes), preference_option)
+    best_groups = _partition_cache.get(key)
+    if best_groups is None:
+        best_groups, _, _ = cached_optimize_graph_partition(directed_G, target_sizes, fingerprint, progress_callback)
+        if preference_option in ['option2', 'option3']:
+            best_groups = partition_with_weight_adjustment(directed_G, target_sizes, best_groups, preference_option, progress_callback,
+                                                           workers=SEARCH_WORKERS)
+        _partition_cache.put(key, best_groups)
+    return _copy_groups(best_groups)
+
+def get_process_pool(max_workers=None):
+    """取得共用的分組行程池，第一次呼叫時建立"""
+    global _process_pool
+    if _process_pool is None:
+        _process_pool = ProcessPoolExecutor(max_workers=max_workers or PARTITION_WORKERS or None)
+    return _process_pool
+
+def _cached_or_submit(executor, directed_G, target_sizes, fingerprint=None):
+    """返回 (快取鍵, 已快取的分組結果或行程池的 Future)"""
+    if fingerprint is None:
+        fingerprint = graph_fingerprint(directed_G)
+    key = ('partition', fingerprint, tuple(target_sizes))
+    result = _partition_cache.get(key)
+    if result is None:
+        result = executor.submit(optimize_graph_partition, directed_G, target_sizes)
+    return key, result
+
+def _resolve(key, result):
+    """等待 Future 完成並將結果存入快取，返回分組結果的複本"""
+    if isinstance(result, Future):
+        result = result.result()
+        _partition_cache.put(key, result)
+    return _copy_groups(result[0])
+
+def parallel_partition_groups(tasks, preference_option, executor):
+    """
+    以行程池同時求解多個互相獨立的分組（例如男生與女生），結果與 partition_groups 相同。
+    option2/option3 的逐步加權在各自的行程中以 partition_with_weight_adjustment 進行。
+
+    參數:
+    - tasks: {label: (directed_G, target_sizes)}
+    - preference_option: 'option1', 'option2' 或 'option3'
+    - executor: concurrent.futures 的 Executor（例如 get_process_pool()）
+
+    返回:
+    - {label: best_groups}
+    """
+    results = {}
+    fingerprints = {}
+    base_jobs = {}
+
+    # 第一階段：所有性別的基本分組同時計算
+    for label, (directed_G, target_sizes) in tasks.items():
+        fingerprints[label] = graph_fingerprint(directed_G)
+        cached_groups = _partition_cache.get(('groups', fingerprints[label], tuple(target_sizes), preference_option))
+        if cached_groups is not None:
+            results[label] = _copy_groups(cached_groups)
+        else:
+            base_jobs[label] = _cached_or_submit(executor, directed_G, target_sizes, fingerprints[label])
+    best_groups = {label: _resolve(*job) for label, job in base_jobs.items()}
+
+    # 第二階段：各性別的逐步加權同時計算（每個性別內的迭代互相依賴，依序進行）
+    if preference_option in ['option2', 'option3']:
+        adjusted_jobs = {label: executor.submit(partition_with_weight_adjustment, tasks[label][0], tasks[label][1],
+                                                groups, preference_option)
+                         for label, groups in best_groups.items()}
+        best_groups = {label: job.result() for label, job in adjusted_jobs.items()}
+
+    for label, groups in best_groups.items():
+        target_sizes = tasks[label][1]
+        _partition_cache.put(('groups', fingerprints[label], tuple(target_sizes), preference_option), groups)
+        results[label] = _copy_groups(groups)
+
+    return results
+
+def generate_partition_colors(num_groups):
+    """
+    根據 num_groups 的數量，從 'tab10' 和 'Set3' 組合後的調色盤（PARTITION_PALETTE）中取出顏色。
+
+    :param num_groups: 所需顏色的數量
+    :return: 生成的顏色列表（hex 格式）
+    """
+    # 如果 num_groups 大於合併後顏色數量，則循環使用這些顏色
+    return [PARTITION_PALETTE[i % len(PARTITION_PALETTE)] for i in range(num_groups)]
+
+def partition_student_groups(df, male_range, female_range, male_target_sizes, female_target_sizes, preference_option, update_target="both", progress_callback=None, executor=None):
+    """
+    求出男生與女生的分組（不需要 Dash 或繪圖套件，網頁與命令列共用）
+
     參數:
     - df: 包含 'st_id', 'order1', 'order2', 'order3' 的 DataFrame
-    - male_range: 男生的範圍，格式為 (male_start, male_end)
-    - female_range: 女生的範圍，格式為 (female_start, female_end)
-    - elements: 包含節點資訊的 Cytoscape 元素列表
-    - male_target_sizes: 男生分組目標大小列表
-    - female_target_sizes: 女生分組目標大小列表
-    - preference_option: 用戶選擇的偏好選項
-    - update_target: 控制要更新的目標 ('male', 'female', 'both')
+    - male_range / female_range: 男生、女生的範圍 (start, end)
+    - male_target_sizes / female_target_sizes: 男生、女生的目標分組大小列表
+    - preference_option / update_target / progress_callback / executor: 同 apply_partition_and_color
 
     返回:
-    - elements: 更新後的 Cytoscape 元素列表
+    - {'male': {group_id: [node1, ...]} 或 None, 'female': ...}，未包含在 update_target 的性別為 None
     """
-    
     # Step 1: 生成男生和女生的有向圖
     G_male, G_female = create_separate_directed_graphs(df, male_range, female_range)
 
-    # 將 target_sizes 轉換成列表
-    male_target_sizes = [int(x.strip()) for x in male_target_sizes.split(',')]
-    female_target_sizes = [int(x.strip()) for x in female_target_sizes.split(',')]
+    # Step 2: 根據用戶選項求出分組（依圖的指紋、分組大小與偏好選項快取），根據 update_target 控制分組的執行
+    def gender_progress(label):
+        if progress_callback is None:
+            return None
+        return lambda explored, best_intra_weight: progress_callback(label, explored, best_intra_weight)
 
-    # Step 2: 根據用戶選項決定是否進行加權處理
-    def partition_with_weight_adjustment(G, target_sizes, original_groups, preference_option):
-        """
-        遞增邊的權重，直到分組結果與原始結果有差異，或者達到上限。
-        
-        參數:
-        - G: 有向圖
-        - target_sizes: 目標分組大小
-        - original_groups: 原始的分組結果
-        
-        返回:
-        - best_groups: 最優分組結果
-        """
-        iteration = 1
-        max_iteration = 10
-        weight = 5
-        best_groups = original_groups
-        while iteration <= max_iteration:
-            # 根據當前 weight 修改圖的權重
-            if preference_option == 'option2':
-                updated_G = weight_edges_for_smallest_group(G, best_groups, weight)
-                if compare_graphs(updated_G, G):
-                    break
-                new_best_groups, _, _ = optimize_graph_partition(updated_G, target_sizes)
-            elif preference_option == 'option3':
-                updated_G = weight_outgoing_edges_for_min_in_degree_nodes(G, weight)
-                if compare_graphs(updated_G, G):
-                    break
-                new_best_groups, _, _ = optimize_graph_partition(updated_G, target_sizes)
-            
-            if new_best_groups != best_groups:
-                return new_best_groups
-            
-            weight += 5
-            iteration += 1
-
-        return best_groups
-
-    # Step 3: 根據分組目標大小生成顏色，根據 update_target 控制分組的執行
-    male_best_groups, female_best_groups = None, None
-    if update_target in ['both', 'male']:
-        male_best_groups, _, _ = optimize_graph_partition(G_male, male_target_sizes)
-    if update_target in ['both', 'female']:
-        female_best_groups, _, _ = optimize_graph_partition(G_female, female_target_sizes)
+    if executor is None and PARTITION_WORKERS > 0:
+        executor = get_process_pool()
 
-    # Step 4: 如果選擇 `option2` 或 `option3`，則增加權重進行重新分組
-    if preference_option in ['option2', 'option3']:
+    male_best_groups, female_best_groups = None, None
+    if executor is not None:
+        # 男生與女生的分組互相獨立，交給行程池同時計算
+        tasks = {}
         if update_target in ['both', 'male']:
-            male_best_groups = partition_with_weight_adjustment(G_male, male_target_sizes, male_best_groups, preference_option)
+            tasks['male'] = (G_male, male_target_sizes)
         if update_target in ['both', 'female']:
-            female_best_groups = partition_with_weight_adjustment(G_female, female_target_sizes, female_best_groups, preference_option)
+            tasks['female'] = (G_female, female_target_sizes)
+        best_groups = parallel_partition_groups(tasks, preference_option, executor)
+        male_best_groups, female_best_groups = best_groups.get('male'), best_groups.get('female')
+    else:
+        if update_target in ['both', 'male']:
+            male_best_groups = partition_groups(G_male, male_target_sizes, preference_option, gender_progress('male'))
+        if update_target in ['both', 'female']:
+            female_best_groups = partition_groups(G_female, female_target_sizes, preference_option, gender_progress('female'))
+
+    return {'male': male_best_groups, 'female': female_best_groups}
+
+def partition_node_colors(df, male_range, female_range, male_target_sizes, female_target_sizes, preference_option, update_target="both", progress_callback=None, executor=None):
+    """
+    求出分組並返回每個節點的分組顏色，參數與 apply_partition_and_color 相同（不需要 elements）
+
+    返回:
+    - {node_id (str): color}，只包含 update_target 指定的性別
+    """
+    # 將 target_sizes 轉換成列表
+    male_target_sizes = [int(x.strip()) for x in male_target_sizes.split(',')]
+    female_target_sizes = [int(x.strip()) for x in female_target_sizes.split(',')]
+
+    best_groups = partition_student_groups(df, male_range, female_range, male_target_sizes, female_target_sizes,
+                                           preference_option, update_target, progress_callback, executor)
+    male_best_groups, female_best_groups = best_groups['male'], best_groups['female']
 
-    # Step 5: 根據分組目標大小生成顏色
+    # Step 3: 根據分組目標大小生成顏色
     total_groups = len(male_target_sizes) + len(female_target_sizes)
     partition_colors = generate_partition_colors(total_groups)
+    node_colors = {}
 
-    # Step 6: 更新男生節點顏色（如果更新目標包含男生）
+    # Step 4: 男生節點顏色（如果更新目標包含男生）
     if update_target in ['both', 'male']:
         male_color_start_index = 0
         for group_id, male_group in male_best_groups.items():
             color = partition_colors[male_color_start_index % total_groups]
-            for node_id in male_group:
-                for element in elements:
-                    if element['data'].get('id') == str(node_id):
-                        element['data']['color'] = color
+            node_colors.update((str(node_id), color) for node_id in male_group)
             male_color_start_index += 1
 
-    # Step 7: 更新女生節點顏色（如果更新目標包含女生）
+    # Step 5: 女生節點顏色（如果更新目標包含女生）
     if update_target in ['both', 'female']:
         female_color_start_index = len(male_target_sizes)
         for group_id, female_group in female_best_groups.items():
             color = partition_colors[female_color_start_index % total_groups]
-            for node_id in female_group:
-                for element in elements:
-                    if element['data'].get('id') == str(node_id):
-                        element['data']['color'] = color
+            node_colors.update((str(node_id), color) for node_id in female_group)
             female_color_start_index += 1
 
+    return node_colors
+
+def apply_partition_and_color(df, male_range, female_range, elements, male_target_sizes, female_target_sizes, preference_option, update_target="both", progress_callback=None, executor=None, element_index=None):
+    """
+    根據分組結果給 elements 中的節點進行分組顏色標記
+    
+    參數:
+    - df: 包含 'st_id', 'order1', 'order2', 'order3' 的 DataFrame
+    - male_range: 男生的範圍，格式為 (male_start, male_end)
+    - female_range: 女生的範圍，格式為 (female_start, female_end)
+    - elements: 包含節點資訊的 Cytoscape 元素列表
+    - male_target_sizes: 男生分組目標大小列表
+    - female_target_sizes: 女生分組目標大小列表
+    - preference_option: 用戶選擇的偏好選項
+    - update_target: 控制要更新的目標 ('male', 'female', 'both')
+    - progress_callback: 可選的進度回報函數 progress_callback(label, explored, best_intra_weight)，
+      label 為 'male' 或 'female'（使用行程池時不回報進度）
+    - executor: 可選的 Executor；未提供且 PARTITION_WORKERS > 0 時使用共用行程池同時計算男女分組
+    - element_index: 可選的 build_element_index(elements) 結果，未提供時在此建立
+
+    返回:
+    - elements: 更新後的 Cytoscape 元素列表
+    """
+    node_colors = partition_node_colors(df, male_range, female_range, male_target_sizes, female_target_sizes,
+                                        preference_option, update_target, progress_callback, executor)
+    return apply_node_colors(elements, node_colors, element_index)
+
+def apply_node_colors(elements, node_colors, element_index=None):
+    """
+    依 {element_id: color} 就地更新元素顏色，不存在的 id 會被略過
+
+    參數:
+    - elements: Cytoscape 元素列表
+    - node_colors: {element_id: color}
+    - element_index: 可選的 build_element_index(elements) 結果，未提供時在此建立
+
+    返回:
+    - elements: 更新後的元素列表
+    """
+    if element_index is None:
+        element_index = build_element_index(elements)
+    for element_id, color in node_colors.items():
+        position = element_index.get(element_id)
+        if position is not None:
+            elements[position]['data']['color'] = color
     return elements
 
-def reset_elements_color(elements, male_range, female_range, update_target="both"):
+def reset_elements_color(elements, male_range, female_range, update_target="both", element_index=None):
     """
     根據男生和女生的範圍，並根據 `update_target` 決定是否重置男生、女生或兩者的 Cytoscape 元素顏色。
 
@@ -502,27 +1162,29 @@ def reset_elements_color(elements, male_range, female_range, update_target="both
     - male_range: 男生編號範圍 (tuple: male_start, male_end)
     - female_range: 女生編號範圍 (tuple: female_start, female_end)
     - update_target: 指定要更新的對象 ('male', 'female', 'both')
+    - element_index: 可選的 build_element_index(elements) 結果，未提供時在此建立
     
     返回:
     - 更新後的 elements
     """
-    male_start, male_end = male_range
-    female_start, female_end = female_range
-    
-    for element in elements:
-        if 'source' not in element['data']:  # 只針對節點元素重置顏色
-            node_id = int(element['data']['id'])  # 將 ID 轉換為整數進行比較
-            
-            # 根據 update_target 決定重置哪些節點的顏色
-            if update_target == "both" or update_target == "male":
-                if male_start <= node_id <= male_end:
-                    element['data']['color'] = '#ED859D'  # 預設的男生顏色
-            
-            if update_target == "both" or update_target == "female":
-                if female_start <= node_id <= female_end:
-                    element['data']['color'] = '#ED859D'  # 預設的女生顏色
+    node_ids = [element['data']['id'] for element in elements if 'source' not in element['data']]
+    return apply_node_colors(elements, reset_node_colors(node_ids, male_range, female_range, update_target), element_index)
+
+def reset_node_colors(node_ids, male_range, female_range, update_target="both"):
+    """
+    返回重置為預設顏色的節點 {node_id (str): color}，其餘參數與 reset_elements_color 相同。
+    只處理 node_ids（圖中實際存在的節點 id）中落在範圍內的節點，範圍再大也不會逐一列舉。
+    """
+    # 根據 update_target 決定重置哪些範圍的節點顏色（男生與女生的預設顏色相同）
+    ranges = []
+    if update_target == "both" or update_target == "male":
+        ranges.append(male_range)
+    if update_target == "both" or update_target == "female":
+        ranges.append(female_range)
+
+    return {node_id: '#ED859D' for node_id in node_ids
+            if any(start <= int(node_id) <= end for start, end in ranges)}
 
-    return elements
 
 
 def compare_graphs(G1, G2):
@@ -0,0 +1,230 @@
+# utils/ilp_partition.py
+import os
+import time
+
+import numpy as np
+
+from utils.compact_graph import CompactGraph, build_compact_graph
+from utils.partition_heuristics import WARM_START_FRACTION, anneal_optimize_groups, heuristic_optimize_groups
+
+# 支援的整數規劃求解器：OR-Tools CP-SAT 與 PuLP 內建的 CBC（皆為選用套件，於使用時才載入）
+ILP_SOLVERS = ('cpsat', 'cbc')
+
+# CP-SAT 的平行搜尋執行緒數（環境變數 NETVIZ_ILP_WORKERS），0 表示使用 CPU 核心數（最多 8）
+ILP_WORKERS = int(os.environ.get('NETVIZ_ILP_WORKERS', '0')) or min(8, os.cpu_count() or 1)
+
+
+def _integer_weights(weights):
+    """CP-SAT 只接受整數係數；非整數權重放大 1000 倍後取整數，返回 (整數權重, 放大倍數)"""
+    if np.all(np.equal(np.mod(weights, 1), 0)):
+        return weights.astype(np.int64), 1
+    return np.rint(weights * 1000).astype(np.int64), 1000
+
+
+def _edge_list(graph):
+    """CSR 對稱儲存中每條無向邊只取一次 (u, v, w)，u < v"""
+    rows = graph.rows()
+    upper = rows < graph.indices
+    return rows[upper], graph.indices[upper], graph.weights[upper]
+
+
+def _size_classes(target_sizes):
+    """目標人數相同的組別彼此可互換，依大小分類：[[g1, g2, ...], ...]，各類內依組別編號排序"""
+    classes = {}
+    for group_id, size in enumerate(target_sizes):
+        classes.setdefault(size, []).append(group_id)
+    return list(classes.values())
+
+
+def _canonical_hint(hint, target_sizes):
+    """
+    重新編號提示分組中人數相同的組別，使其符合對稱性破除的順序：
+    同一類中各組依最小節點編號排列，空組排在最後
+    """
+    first_node = {}
+    for v, group_id in enumerate(hint):
+        first_node.setdefault(group_id, v)
+    relabel = {}
+    for groups in _size_classes(target_sizes):
+        ordered = sorted(groups, key=lambda group_id: first_node.get(group_id, len(hint)))
+        relabel.update(zip(ordered, groups))
+    return [relabel[group_id] for group_id in hint]
+
+
+def _solve_cpsat(graph, target_sizes, edges, time_limit, hint):
+    try:
+        from ortools.sat.python import cp_model
+    except ImportError as e:
+        raise ImportError("The 'cpsat' solver requires OR-Tools (pip install ortools)") from e
+
+    sources, targets, weights = edges
+    int_weights, scale = _integer_weights(weights)
+    num_nodes, num_groups = len(graph), len(target_sizes)
+
+    model = cp_model.CpModel()
+    x = [[model.NewBoolVar(f'x_{v}_{g}') for g in range(num_groups)] for v in range(num_nodes)]
+    for v in range(num_nodes):
+        model.AddExactlyOne(x[v])
+    for g, size in enumerate(target_sizes):
+        group_size = sum(x[v][g] for v in range(num_nodes))
+        if sum(target_sizes) == num_nodes:
+            model.Add(group_size == size)
+        else:
+            model.Add(group_size <= size)
+
+    # 對稱性破除：人數相同的組別可互換，要求同一類中第 j 組的最小節點編號大於第 j-1 組的最小節點編號。
+    # seen[v][g] = 1 表示節點 0..v 中有節點在第 g 組；節點 v 只能加入第 j 組，若節點 0..v-1 已有人在第 j-1 組。
+    # 因此節點 0 固定在其人數類別的第一組（所有組別人數相同時即第 0 組）。
+    hint = _canonical_hint(hint, target_sizes)
+    for groups in _size_classes(target_sizes):
+        for previous, g in zip(groups, groups[1:]):
+            model.Add(x[0][g] == 0)
+            seen, hint_seen = x[0][previous], hint[0] == previous
+            for v in range(1, num_nodes):
+                model.AddImplication(x[v][g], seen)
+                if v == num_nodes - 1:
+                    break
+                next_seen = model.NewBoolVar(f'seen_{v}_{previous}')
+                model.AddBoolOr([seen, x[v][previous]]).OnlyEnforceIf(next_seen)
+                model.AddImplication(seen, next_seen)
+                model.AddImplication(x[v][previous], next_seen)
+                hint_seen = hint_seen or hint[v] == previous
+                model.AddHint(next_seen, hint_seen)
+                seen = next_seen
+
+    # y[e][g] = 1 表示邊 e 的兩端都在第 g 組
+    objective = []
+    incident = [[[] for _ in range(num_groups)] for _ in range(num_nodes)]
+    for e, (u, v, w) in enumerate(zip(sources.tolist(), targets.tolist(), int_weights.tolist())):
+        for g in range(num_groups):
+            y = model.NewBoolVar(f'y_{e}_{g}')
+            model.AddImplication(y, x[u][g])
+            model.AddImplication(y, x[v][g])
+            incident[u][g].append(y)
+            incident[v][g].append(y)
+            # 以啟發式分組作為完整的初始提示（含 y），讓求解器從可行解開始改善
+            model.AddHint(y, hint[u] == g and hint[v] == g)
+            objective.append(w * y)
+    # 加強連結（線性鬆弛較緊）：節點 u 在第 g 組時最多與 size - 1 個同組節點相連，不在時為 0
+    for u in range(num_nodes):
+        for g, size in enumerate(target_sizes):
+            if len(incident[u][g]) > size - 1:
+                model.Add(sum(incident[u][g]) <= (size - 1) * x[u][g])
+    model.Maximize(sum(objective))
+
+    for v, group_id in enumerate(hint):
+        for g in range(num_groups):
+            model.AddHint(x[v][g], g == group_id)
+
+    solver = cp_model.CpSolver()
+    solver.parameters.num_workers = ILP_WORKERS
+    if time_limit is not None:
+        solver.parameters.max_time_in_seconds = float(time_limit)
+    status = solver.Solve(model)
+    if status not in (cp_model.OPTIMAL, cp_model.FEASIBLE):
+        return None, False, None
+
+    assignment = np.array([next(g for g in range(num_groups) if solver.Value(x[v][g])) for v in range(num_nodes)])
+    return assignment, status == cp_model.OPTIMAL, solver.BestObjectiveBound() / scale
+
+
+def _solve_cbc(graph, target_sizes, edges, time_limit, hint):
+    try:
+        import pulp
+    except ImportError as e:
+        raise ImportError("The 'cbc' solver requires PuLP (pip install pulp)") from e
+
+    sources, targets, weights = edges
+    num_nodes, num_groups = len(graph), len(target_sizes)
+
+    # 以最小化負的組內權重求解：CBC 在最大化（-max）時以相反的正負號比較初始解，會以較差的解取代它
+    problem = pulp.LpProblem('group_partition', pulp.LpMinimize)
+    x = [[pulp.LpVariable(f'x_{v}_{g}', cat='Binary') for g in range(num_groups)] for v in range(num_nodes)]
+    objective = []
+    for e, (u, v, w) in enumerate(zip(sources.tolist(), targets.tolist(), weights.tolist())):
+        for g in range(num_groups):
+            y = pulp.LpVariable(f'y_{e}_{g}', cat='Binary')
+            problem += y <= x[u][g]
+            problem += y <= x[v][g]
+            # 初始解需包含 y，否則 CBC 視為不完整而捨棄
+            y.setInitialValue(1 if hint[u] == g and hint[v] == g else 0)
+            objective.append(w * y)
+    problem += -pulp.lpSum(objective)
+    for v in range(num_nodes):
+        problem += pulp.lpSum(x[v]) == 1
+    for g, size in enumerate(target_sizes):
+        group_size = pulp.lpSum(x[v][g] for v in range(num_nodes))
+        if sum(target_sizes) == num_nodes:
+            problem += group_size == size
+        else:
+            problem += group_size <= size
+
+    # 以啟發式分組作為初始解
+    for v, group_id in enumerate(hint):
+        for g in range(num_groups):
+            x[v][g].setInitialValue(1 if g == group_id else 0)
+
+    problem.solve(pulp.PULP_CBC_CMD(msg=False, timeLimit=time_limit, warmStart=True))
+    if problem.sol_status not in (pulp.LpSolutionOptimal, pulp.LpSolutionIntegerFeasible):
+        return None, False, None
+
+    assignment = np.array([max(range(num_groups), key=lambda g: x[v][g].value() or 0) for v in range(num_nodes)])
+    # CBC 透過 PuLP 無法取得最佳上界
+    return assignment, problem.sol_status == pulp.LpSolutionOptimal, None
+
+
+def ilp_optimize_groups(G, target_sizes, solver='cpsat', time_limit=None, stats=None):
+    """
+    以整數規劃精確求解分組：最大化組內邊權重，且每組人數等於 target_sizes。
+    x[v][g] 表示節點 v 分到第 g 組，y[e][g] 表示邊 e 的兩端都在第 g 組。
+    求解器從交換改善與模擬退火的較佳分組（最多使用時間上限的 WARM_START_FRACTION）出發，
+    時間上限內未證明最優時返回求解器結果與初始分組中較好的一個。
+
+    參數:
+    - G: CompactGraph，或邊帶有 'weight' 屬性的無向圖 (networkx.Graph)
+    - target_sizes: 每組的目標人數列表
+    - solver: 'cpsat'（OR-Tools）或 'cbc'（PuLP），需另外安裝對應套件
+    - time_limit: 總時間上限（秒，包含初始分組），None 表示直到證明最優
+    - stats: 可選的 dict，寫入 stats['gap']：相對最優性差距 (上界 - 目標值) / 目標值，
+      0 表示已證明最優，無法取得上界時（CBC 未證明最優）為 None
+
+    返回:
+    - best_groups: 分組方案 {group_id: [node1, node2, ...]}，無可行解時為 None
+    - best_intra_weight: 組內邊權重總和
+    - best_inter_weight: 組間邊權重總和
+    """
+    if solver not in ILP_SOLVERS:
+        raise ValueError(f"Unknown ILP solver: {solver} (expected one of {ILP_SOLVERS})")
+    graph = G if isinstance(G, CompactGraph) else build_compact_graph(G)
+
+    # 以交換改善與模擬退火中較好的分組作為初始提示，所用時間從求解器的時間上限中扣除
+    start = time.monotonic()
+    # 沒有時間上限時交換改善做到收斂，模擬退火沿用預設的 1 秒
+    hint_limit = None if time_limit is None else time_limit * WARM_START_FRACTION
+    hint_result = max(heuristic_optimize_groups(graph, target_sizes, hint_limit),
+                      anneal_optimize_groups(graph, target_sizes, 1.0 if hint_limit is None else hint_limit),
+                      key=lambda result: result[1])
+    hint = [0] * len(graph)
+    for group_id, members in hint_result[0].items():
+        for node in members:
+            hint[graph.index[node]] = group_id
+    remaining = None if time_limit is None else max(0.0, time_limit - (time.monotonic() - start))
+
+    solve = _solve_cpsat if solver == 'cpsat' else _solve_cbc
+    assignment, optimal, bound = solve(graph, target_sizes, _edge_list(graph), remaining, hint)
+    if assignment is None or graph.group_weights(assignment)[0] < hint_result[1]:
+        # 求解器在時間內沒有找到比初始提示更好的分組
+        assignment = np.array(hint)
+    best_intra_weight, best_inter_weight = graph.group_weights(assignment)
+    if stats is not None:
+        if optimal:
+            stats['gap'] = 0.0
+        elif bound is None:
+            stats['gap'] = None
+        else:
+            stats['gap'] = max(0.0, bound - best_intra_weight) / max(abs(best_intra_weight), 1)
+
+    best_groups = {group_id: [] for group_id in range(len(target_sizes))}
+    for i, group_id in enumerate(assignment.tolist()):
+        best_groups[group_id].append(graph.nodes[i])
+    return best_groups, best_intra_weight, best_inter_weight
@@ -0,0 +1,254 @@
+# utils/partition_heuristics.py
+import math
+import time
+
+import numpy as np
+
+from utils.compact_graph import CompactGraph, build_compact_graph
+
+# 交換改善的最大輪數，避免浮點權重在極小增益間來回
+MAX_SWAP_PASSES = 100
+
+# 分支定界與整數規劃前以貪婪交換與模擬退火求初始解，最多使用時間上限的這個比例
+WARM_START_FRACTION = 0.1
+
+
+def _groups_from_assignment(graph, assignment, num_groups):
+    """將節點編號 -> 組別的陣列轉回 {group_id: [node1, node2, ...]}"""
+    groups = {group_id: [] for group_id in range(num_groups)}
+    for i, group_id in enumerate(assignment.tolist()):
+        groups[group_id].append(graph.nodes[i])
+    return groups
+
+
+def _connection_matrix(graph, assignment, num_groups):
+    """connection[v, g]：節點 v 與第 g 組所有節點之間的邊權重和"""
+    connection = np.zeros((len(graph), num_groups))
+    np.add.at(connection, (graph.rows(), assignment[graph.indices]), graph.weights)
+    return connection
+
+
+def _weight_row(graph, i):
+    """節點 i 對所有節點的邊權重向量"""
+    if graph.dense is not None:
+        return graph.dense[i]
+    row = np.zeros(len(graph))
+    neighbor_ids, neighbor_weights = graph.neighbors(i)
+    row[neighbor_ids] = neighbor_weights
+    return row
+
+
+def greedy_seed_groups(graph, target_sizes):
+    """
+    依加權度數由大到小，將每個節點放入目前連接權重最大且尚有空位的組；
+    沒有任何連接時放入剩餘空位最多的組，讓各組都有起始的核心成員。
+
+    參數:
+    - graph: CompactGraph
+    - target_sizes: 每組的目標人數列表（總和不可小於節點數）
+
+    返回:
+    - assignment: 節點編號 -> 組別的 NumPy 陣列
+    """
+    if sum(target_sizes) < len(graph):
+        raise ValueError(f"Group sizes ({sum(target_sizes)}) are smaller than the node count ({len(graph)})")
+
+    num_groups = len(target_sizes)
+    remaining = np.array(target_sizes, dtype=float)
+    connection = np.zeros((len(graph), num_groups))
+    assignment = np.full(len(graph), -1)
+
+    for node in np.argsort(-graph.weighted_degree(), kind='stable'):
+        # 連接權重相同時，以剩餘空位數作為次要排序（權重為整數，空位分數小於 1）
+        score = connection[node] + remaining / (remaining.sum() + 1)
+        score[remaining <= 0] = -np.inf
+        group_id = int(np.argmax(score))
+        assignment[node] = group_id
+        remaining[group_id] -= 1
+        neighbor_ids, neighbor_weights = graph.neighbors(node)
+        connection[neighbor_ids, group_id] += neighbor_weights
+
+    return assignment
+
+
+def swap_refine_groups(graph, assignment, num_groups, time_limit=None):
+    """
+    以保持各組人數不變的兩兩交換改善分組（Kernighan-Lin 式的增益陣列），直到沒有可改善的交換為止。
+
+    交換 u（第 a 組）與 v（第 b 組）的增益為
+    (C[u, b] - C[u, a]) + (C[v, a] - C[v, b]) - 2 * w(u, v)，
+    其中 C 為節點對各組的連接權重矩陣；每次交換只需更新 u、v 鄰居的 C。
+
+    參數:
+    - graph: CompactGraph
+    - assignment: 節點編號 -> 組別的 NumPy 陣列（就地修改）
+    - num_groups: 組數
+    - time_limit: 時間上限（秒），None 表示不限制
+
+    返回:
+    - assignment: 改善後的分組陣列
+    """
+    deadline = None if time_limit is None else time.monotonic() + time_limit
+    connection = _connection_matrix(graph, assignment, num_groups)
+    node_ids = np.arange(len(graph))
+
+    def move(node, old_group, new_group):
+        neighbor_ids, neighbor_weights = graph.neighbors(node)
+        connection[neighbor_ids, old_group] -= neighbor_weights
+        connection[neighbor_ids, new_group] += neighbor_weights
+        assignment[node] = new_group
+
+    for _ in range(MAX_SWAP_PASSES):
+        improved = False
+        for u in range(len(graph)):
+            group_u = assignment[u]
+            # 每個節點移到各組（不含自己的組）的增益
+            own_connection = connection[node_ids, assignment]
+            gains = (connection[u, assignment] - connection[u, group_u]) \
+                + (connection[:, group_u] - own_connection) \
+                - 2 * _weight_row(graph, u)
+            gains[assignment == group_u] = -np.inf
+            v = int(np.argmax(gains))
+            if gains[v] > 1e-9:
+                group_v = assignment[v]
+                move(u, group_u, group_v)
+                move(v, group_v, group_u)
+                improved = True
+            if deadline is not None and time.monotonic() > deadline:
+                return assignment
+        if not improved:
+            break
+
+    return assignment
+
+
+def heuristic_optimize_groups(G, target_sizes, time_limit=None):
+    """
+    大型名單的啟發式分組：貪婪法產生符合 target_sizes 的初始分組，再以兩兩交換改善。
+    不保證最優，但數百到數千人的名單也能在一秒內完成。
+
+    參數:
+    - G: CompactGraph，或邊帶有 'weight' 屬性的無向圖 (networkx.Graph)
+    - target_sizes: 每組的目標人數列表
+    - time_limit: 交換改善的時間上限（秒），None 表示直到沒有可改善的交換
+
+    返回:
+    - best_groups: 分組方案 {group_id: [node1, node2, ...]}
+    - best_intra_weight: 組內邊權重總和
+    - best_inter_weight: 組間邊權重總和
+    """
+    graph = G if isinstance(G, CompactGraph) else build_compact_graph(G)
+    assignment = greedy_seed_groups(graph, target_sizes)
+    assignment = swap_refine_groups(graph, assignment, len(target_sizes), time_limit)
+    best_intra_weight, best_inter_weight = graph.group_weights(assignment)
+    return _groups_from_assignment(graph, assignment, len(target_sizes)), best_intra_weight, best_inter_weight
+
+
+def anneal_optimize_groups(G, target_sizes, time_limit=1.0, seed=46, initial_temperature=None,
+                           cooling_rate=0.995, moves_per_temperature=None, min_temperature=1e-3):
+    """
+    以模擬退火搜尋分組（隨時可中斷的求解器）：從貪婪初始分組出發，隨機交換兩個不同組的節點，
+    或在目標人數有空位時把節點移到該組；較差的移動以 exp(增益 / 溫度) 的機率接受，
+    溫度每 moves_per_temperature 次移動乘以 cooling_rate。
+    每次移動的增益只需讀取連接權重表，接受後更新兩個節點的鄰居，成本為 O(度數)。
+
+    任何時候停止都會返回目前找到的最佳合法分組；相同 seed 會得到相同的結果
+    （時間上限在搜尋完成前用盡時除外）。
+
+    參數:
+    - G: CompactGraph，或邊帶有 'weight' 屬性的無向圖 (networkx.Graph)
+    - target_sizes: 每組的目標人數列表（總和不可小於節點數）
+    - time_limit: 時間上限（秒），None 表示直到溫度降到 min_temperature
+    - seed: 亂數種子
+    - initial_temperature: 初始溫度，None 表示使用最大邊權重
+    - cooling_rate: 每個溫度階段的冷卻比例 (0, 1)
+    - moves_per_temperature: 每個溫度階段嘗試的移動次數，None 表示使用節點數
+    - min_temperature: 溫度低於此值時停止
+
+    返回:
+    - best_groups: 分組方案 {group_id: [node1, node2, ...]}
+    - best_intra_weight: 組內邊權重總和
+    - best_inter_weight: 組間邊權重總和
+    """
+    graph = G if isinstance(G, CompactGraph) else build_compact_graph(G)
+    num_nodes, num_groups = len(graph), len(target_sizes)
+    assignment = greedy_seed_groups(graph, target_sizes)
+    if num_nodes < 2 or num_groups < 2 or len(graph.weights) == 0:
+        best_intra_weight, best_inter_weight = graph.group_weights(assignment)
+        return _groups_from_assignment(graph, assignment, num_groups), best_intra_weight, best_inter_weight
+
+    rng = np.random.default_rng(seed)
+    deadline = None if time_limit is None else time.monotonic() + time_limit
+    temperature = float(graph.weights.max()) if initial_temperature is None else float(initial_temperature)
+    moves_per_temperature = moves_per_temperature or num_nodes
+
+    # 熱路徑使用 Python 串列：逐一讀取 NumPy 純量較慢
+    adjacency = graph.adjacency_lists()
+    neighbor_weights = [dict(neighbors) for neighbors in adjacency]
+    connection = _connection_matrix(graph, assignment, num_groups).tolist()
+    group_of = assignment.tolist()
+    members = [[] for _ in range(num_groups)]
+    position = [0] * num_nodes
+    for node, group_id in enumerate(group_of):
+        position[node] = len(members[group_id])
+        members[group_id].append(node)
+    spare = [size - len(members[group_id]) for group_id, size in enumerate(target_sizes)]
+
+    def move(node, new_group):
+        old_group = group_of[node]
+        for neighbor, weight in adjacency[node]:
+            connection[neighbor][old_group] -= weight
+            connection[neighbor][new_group] += weight
+        # 以最後一個成員填補空位，O(1) 移出
+        last = members[old_group].pop()
+        if last != node:
+            members[old_group][position[node]] = last
+            position[last] = position[node]
+        position[node] = len(members[new_group])
+        members[new_group].append(node)
+        spare[old_group] += 1
+        spare[new_group] -= 1
+        group_of[node] = new_group
+
+    current_intra = graph.group_weights(assignment)[0]
+    best_intra = current_intra
+    best_assignment = list(group_of)
+
+    while temperature > min_temperature:
+        # 每批移動預先產生亂數，減少呼叫亂數產生器的次數
+        nodes = rng.integers(num_nodes, size=moves_per_temperature).tolist()
+        offsets = rng.integers(1, num_groups, size=moves_per_temperature).tolist()
+        picks = rng.random(moves_per_temperature).tolist()
+        thresholds = rng.random(moves_per_temperature).tolist()
+
+        for u, offset, pick, threshold in zip(nodes, offsets, picks, thresholds):
+            group_u = group_of[u]
+            group_v = (group_u + offset) % num_groups
+            row_u = connection[u]
+            if spare[group_v] > 0:
+                v = None
+                gain = row_u[group_v] - row_u[group_u]
+            elif members[group_v]:
+                v = members[group_v][int(pick * len(members[group_v]))]
+                row_v = connection[v]
+                gain = (row_u[group_v] - row_u[group_u]) + (row_v[group_u] - row_v[group_v]) \
+                    - 2 * neighbor_weights[u].get(v, 0)
+            else:
+                continue
+
+            if gain >= 0 or threshold < math.exp(gain / temperature):
+                move(u, group_v)
+                if v is not None:
+                    move(v, group_u)
+                current_intra += gain
+                if current_intra > best_intra:
+                    best_intra = current_intra
+                    best_assignment = list(group_of)
+
+        temperature *= cooling_rate
+        if deadline is not None and time.monotonic() > deadline:
+            break
+
+    best_assignment = np.array(best_assignment)
+    best_intra_weight, best_inter_weight = graph.group_weights(best_assignment)
+    return _groups_from_assignment(graph, best_assignment, num_groups), best_intra_weight, best_inter_weight
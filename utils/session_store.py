@@ -0,0 +1,139 @@
+# utils/session_store.py
+import hashlib
+import os
+import pickle
+import threading
+import time
+
+from utils.cache import LRUCache
+
+
+class SessionStore:
+    """
+    伺服器端的工作階段快取：記憶體中的 LRU 快取，加上本機檔案的備援。
+
+    - 每個項目在最後一次存取後 ttl 秒過期（記憶體與檔案皆是）
+    - 提供 directory 時（第一次寫入時建立），put 會同時寫入檔案；記憶體中找不到（被淘汰、其他行程、伺服器重啟）時由檔案讀回
+    - 介面與 LRUCache 相同（get / put / pop / clear），可直接取代
+    """
+
+    def __init__(self, max_entries=16, max_bytes=None, ttl=3600, directory=None):
+        self.ttl = ttl
+        self.directory = directory
+        self._memory = LRUCache(max_entries=max_entries, max_bytes=max_bytes)
+        self._last_access = {}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._memory)
+
+    def __contains__(self, key):
+        return self.get(key) is not None
+
+    def _path(self, key):
+        # 以雜湊值作為檔名，任何字串鍵都能安全地對應到檔案
+        return os.path.join(self.directory, hashlib.sha256(str(key).encode()).hexdigest() + '.pkl')
+
+    def _expired(self, timestamp):
+        return self.ttl is not None and time.time() - timestamp > self.ttl
+
+    def get(self, key, default=None):
+        """取出項目並重設其過期時間；過期或不存在時返回 default"""
+        value = self._memory.get(key)
+        with self._lock:
+            last_access = self._last_access.get(key)
+        if value is not None and last_access is not None and not self._expired(last_access):
+            self._touch(key)
+            return value
+        if value is not None:
+            self.pop(key)
+
+        value = self._load(key)
+        if value is None:
+            return default
+        value, size = value
+        self._memory.put(key, value, size)
+        self._touch(key)
+        return value
+
+    def put(self, key, value, size=0):
+        """存入項目（size 為估計大小，bytes），有設定 directory 時同時寫入檔案"""
+        self._memory.put(key, value, size)
+        self._touch(key)
+        if self.directory is not None:
+            self._dump(key, value, size)
+            self.purge_expired()
+
+    def pop(self, key, default=None):
+        with self._lock:
+            self._last_access.pop(key, None)
+        value = self._memory.pop(key, default)
+        if self.directory is not None:
+            try:
+                os.remove(self._path(key))
+            except FileNotFoundError:
+                pass
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._last_access.clear()
+        self._memory.clear()
+        if self.directory is not None and os.path.isdir(self.directory):
+            for name in os.listdir(self.directory):
+                if name.endswith('.pkl'):
+                    os.remove(os.path.join(self.directory, name))
+
+    def purge_expired(self):
+        """移除已過期的項目與檔案"""
+        if self.ttl is None:
+            return
+        with self._lock:
+            expired = [key for key, timestamp in self._last_access.items() if self._expired(timestamp)]
+        for key in expired:
+            self.pop(key)
+        if self.directory is None or not os.path.isdir(self.directory):
+            return
+        for name in os.listdir(self.directory):
+            path = os.path.join(self.directory, name)
+            try:
+                if name.endswith('.pkl') and self._expired(os.path.getmtime(path)):
+                    os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    def _touch(self, key):
+        now = time.time()
+        with self._lock:
+            self._last_access[key] = now
+        if self.directory is not None:
+            try:
+                os.utime(self._path(key), (now, now))
+            except FileNotFoundError:
+                pass
+
+    def _dump(self, key, value, size):
+        # 先寫入暫存檔再改名，避免其他行程讀到寫到一半的檔案
+        os.makedirs(self.directory, exist_ok=True)
+        path = self._path(key)
+        temp_path = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+        with open(temp_path, 'wb') as f:
+            pickle.dump((key, value, size), f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(temp_path, path)
+
+    def _load(self, key):
+        """由檔案讀回 (value, size)，檔案不存在、過期或損毀時返回 None"""
+        if self.directory is None:
+            return None
+        path = self._path(key)
+        try:
+            if self._expired(os.path.getmtime(path)):
+                os.remove(path)
+                return None
+            with open(path, 'rb') as f:
+                stored_key, value, size = pickle.load(f)
+        except (FileNotFoundError, EOFError, pickle.UnpicklingError):
+            return None
+        if stored_key != key:
+            return None
+        return value, size
@@ -0,0 +1,177 @@
+# utils/validation.py
+# 只在實際驗證名單時才載入 networkx 與圖的工具，is_valid 等輕量函數可在啟動時匯入
+import math
+
+# 男女組別大小都正確時的驗證訊息
+VALIDATION_SUCCESS = "Group size verification successful"
+
+# 檢查男生和女生範圍是否重疊
+def check_range_overlap(male_end, female_start):
+    if male_end >= female_start:
+        return "Error: Male and Female ranges overlap!"
+    return ""
+
+# 檢查是否有 st_id 不在定義的男生或女生範圍內
+def check_invalid_ids(df, male_start, male_end, female_start, female_end):
+    invalid_ids = df[~df['st_id'].between(male_start, male_end) & ~df['st_id'].between(female_start, female_end)]
+    if not invalid_ids.empty:
+        return f"Warning: Some st_id are outside the defined male or female ranges! Invalid st_id: {invalid_ids['st_id'].tolist()}."
+    return ""
+
+# 檢查志願是否都指向名單中的座號（指向不存在的座號會在分組時多出不存在的學生）
+def check_unknown_targets(df):
+    st_ids = df['st_id'].to_numpy()
+    orders = df[['order1', 'order2', 'order3']].to_numpy()
+    rows, columns = (~df[['order1', 'order2', 'order3']].isin(set(st_ids.tolist()))).to_numpy().nonzero()
+    if len(rows):
+        targets_info = ", ".join(f"{st_ids[row]} -> {orders[row, column]}" for row, column in zip(rows.tolist(), columns.tolist()))
+        return f"Warning: Some preferences point to IDs that are not in the roster! Unknown targets: {targets_info}."
+    return ""
+
+# 檢查男生和女生網絡是否連通：一次計算弱連通分量，列出同時包含男生與女生的分量中跨性別的邊
+def check_network_connection(G, male_nodes, female_nodes):
+    import networkx as nx
+
+    gender = {node: 'male' for node in male_nodes}
+    gender.update({node: 'female' for node in female_nodes})
+
+    cross_edges = []
+    for component in nx.weakly_connected_components(G):
+        genders = {gender[node] for node in component if node in gender}
+        if len(genders) < 2:
+            continue
+        # 兩端性別不同（含不屬於任何範圍的節點）的邊即為連接男女網絡的邊
+        cross_edges.extend((u, v) for u, v in G.edges(component) if gender.get(u) != gender.get(v))
+
+    if cross_edges:
+        edges_info = ", ".join(f"{u} -> {v}" for u, v in sorted(cross_edges))
+        return f"Warning: Male and Female networks are connected! Cross edges: {edges_info}."
+    return ""
+
+def check_group_size(group_sizes_input, actual_count, group_label):
+    """
+    檢查group size是否符合實際人數
+    - group_sizes_input: 用戶輸入的組別大小 (string，如 "4, 4, 4, 2")
+    - actual_count: 實際的人數
+    - group_label: 組別標籤 (用於warning，例如 "Male" 或 "Female")
+
+    返回: 警告訊息，如果一切正常則返回空字串
+    """
+    if not group_sizes_input:
+        return f"Warning: {group_label} group sizes are empty!"
+    
+    try:
+        # 將用戶輸入的組別大小轉換為整數列表
+        group_sizes = [int(x.strip()) for x in group_sizes_input.split(',')]
+        # 計算組別大小的總和
+        total_group_size = sum(group_sizes)
+        if total_group_size != actual_count:
+            return f"Warning: {group_label} group sizes ({total_group_size}) do not match the actual count ({actual_count})!"
+        return f"{group_label} group size verification successful!"
+    except ValueError:
+        return f"Warning: Invalid {group_label} group sizes format!"
+
+def parse_group_sizes(value):
+    """將 "4, 4, 4, 2" 形式的組別大小轉為整數列表，空值返回 None"""
+    if value is None or (isinstance(value, float) and math.isnan(value)) or str(value).strip() == '':
+        return None
+    if isinstance(value, (int, float)):
+        return [int(value)]
+    return [int(x.strip()) for x in str(value).split(',')]
+
+# 問題列原因的顯示文字
+ROW_ERROR_LABELS = {
+    'missing': 'missing value',
+    'non_integer': 'not an integer',
+    'out_of_range': 'number too large',
+    'self_reference': 'lists own ID',
+    'duplicate_choice': 'repeats a choice',
+    'duplicate_id': 'duplicate ID',
+}
+
+def format_upload_report(report, max_rows=10):
+    """
+    將上傳檔案的錯誤報告轉為顯示文字；沒有問題時返回空字串
+
+    參數:
+    - report: get_upload_report 或 validate_roster_chunks 的錯誤報告，None 表示尚未上傳
+    - max_rows: 最多列出的問題列數
+    """
+    if report is None:
+        return ""
+    if report['error'] is not None:
+        return f"Error: could not read the file ({report['error']})"
+    messages = []
+    if report['dropped']:
+        counts = ", ".join(f"{ROW_ERROR_LABELS[reason]}: {count}" for reason, count in report['counts'].items() if count)
+        rows = ", ".join(f"row {error['row']} ({ROW_ERROR_LABELS[error['reason']]})" for error in report['errors'][:max_rows])
+        if report['dropped'] > max_rows:
+            rows += ", ..."
+        messages.append(f"Warning: skipped {report['dropped']} of {report['rows']} rows ({counts}): {rows}")
+    # 舊版工作階段保存的報告沒有 unknown_targets
+    if report.get('unknown_targets'):
+        targets = ", ".join(f"row {error['row']} ({error['st_id']} -> {error['target']})"
+                            for error in report['target_errors'][:max_rows])
+        if report['unknown_targets'] > max_rows:
+            targets += ", ..."
+        messages.append(f"Warning: {report['unknown_targets']} preferences point to IDs that are not in the roster: {targets}")
+    return " ".join(messages)
+
+# 驗證成功且沒有警告時才進行分組
+def is_valid(warning_message, validation_message):
+    return validation_message == VALIDATION_SUCCESS and warning_message == ""
+
+def validate_roster(df, male_start, male_end, female_start, female_end, male_group_sizes, female_group_sizes, get_graph=None):
+    """
+    網頁與命令列共用的名單驗證：範圍重疊、範圍外的座號、指向不存在座號的志願、男女網絡是否相連、組別大小是否與人數相符
+
+    參數:
+    - df: 包含 'st_id', 'order1', 'order2', 'order3' 的 DataFrame
+    - male_start, male_end, female_start, female_end: 男生、女生的座號範圍
+    - male_group_sizes, female_group_sizes: 組別大小字串，如 "4, 4, 4, 2"
+    - get_graph: 可選的函數，返回完整的有向圖（例如快取中的圖）；None 表示以 create_directed_graph(df) 建立
+
+    返回:
+    - warning_message: 警告訊息，沒有問題時為空字串
+    - validation_message: 組別大小的驗證訊息，全部正確時為 VALIDATION_SUCCESS
+    - male_group_check, female_group_check: 各性別的組別大小檢查結果
+    """
+    from utils.graph_utilities import create_directed_graph
+
+    validation_message = ""
+    male_group_check = ""
+    female_group_check = ""
+
+    # 检查范围是否重叠
+    warning_message = check_range_overlap(male_end, female_start)
+
+    # 检查是否有 st_id 不在定义的范围内
+    warning_message += check_invalid_ids(df, male_start, male_end, female_start, female_end)
+
+    # 检查志愿是否都指向名单中的座号
+    warning_message += check_unknown_targets(df)
+    if warning_message:
+        return warning_message, validation_message, male_group_check, female_group_check
+    # 使用男生和女生的范围过滤数据
+    df_male = df[df['st_id'].between(male_start, male_end)]
+    df_female = df[df['st_id'].between(female_start, female_end)]
+
+    G = get_graph() if get_graph is not None else create_directed_graph(df)
+
+    # 男生和女生的节点集合
+    male_nodes = set(df_male['st_id'])
+    female_nodes = set(df_female['st_id'])
+
+    # 检查男生和女生网络是否连接
+    warning_message += check_network_connection(G, male_nodes, female_nodes)
+
+    # 检查 group size 是否正确
+    male_group_check = check_group_size(male_group_sizes, len(df_male), "Male")
+    female_group_check = check_group_size(female_group_sizes, len(df_female), "Female")
+
+    # 检查结果
+    validation_message = f"{male_group_check} {female_group_check}"
+    if "Warning" not in validation_message:
+        validation_message = VALIDATION_SUCCESS
+
+    return warning_message, validation_message, male_group_check, female_group_check